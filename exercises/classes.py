@@ -1,37 +1,2750 @@
 """Class exercises"""
+from array import array
+from bisect import bisect_left, bisect_right
+from calendar import monthrange
+from collections import Counter
+from collections.abc import Sequence, Set
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from copy import copy
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from functools import partial
+from heapq import heapify, heappop, heappush, heappushpop, heapreplace
+from itertools import accumulate, chain, compress, count, islice, repeat
+from keyword import iskeyword
+from locale import LC_TIME, setlocale
+from operator import add, attrgetter, sub
+from mmap import ACCESS_READ, mmap as memory_map
+import json
+import os
+import pickle
+from random import choice
+import struct
+import sys
+from threading import Lock, RLock
+from weakref import WeakSet
+
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class AccountJournal:
+    """Write-ahead log file of one account's transactions.
+
+    Each record is a transaction number, a kind code, and an amount,
+    packed into 17 bytes.  Records are fsynced in batches of
+    ``sync_every``.  Every ``snapshot_every`` records (if given) the
+    whole transaction log is written to a snapshot file and the
+    write-ahead log is emptied, so recovery only replays recent records.
+    """
+
+    _RECORD = struct.Struct('<QBq')
+    _FLOAT_RECORD = struct.Struct('<QBd')
+    _FLOAT = 0x80
+    _TRUNCATE = 0x7F
+    _SNAPSHOT = struct.Struct('<8sQcc')
+    _MAGIC = b'ACCTSNAP'
+
+    def __init__(self, path, sync_every=100, snapshot_every=None):
+        self.path = os.fspath(path)
+        self.snapshot_path = self.path + '.snapshot'
+        self.sync_every = sync_every
+        self.snapshot_every = snapshot_every
+        self._file = open(self.path, 'ab')
+        # Drop any partially written record left behind by a crash
+        end = self._file.seek(0, os.SEEK_END)
+        self._file.truncate(end - end % self._RECORD.size)
+        self._unsynced = 0
+        self._since_snapshot = 0
+
+    def _pack(self, number, code, amount, balance):
+        if type(amount) is int:
+            if not _INT64_MIN <= amount <= _INT64_MAX:
+                raise ValueError(f"Amount too large to journal: {amount!r}")
+            if type(balance) is int and not _INT64_MIN <= balance <= _INT64_MAX:
+                raise ValueError(f"Balance too large to journal: {balance!r}")
+            return self._RECORD.pack(number, code, amount)
+        if type(amount) is not float:
+            raise TypeError(f"Only int and float amounts can be journaled: {amount!r}")
+        return self._FLOAT_RECORD.pack(number, code | self._FLOAT, amount)
+
+    def record(self, log, start, codes, amounts, balances):
+        """Write records for transactions numbered from start onward.
+
+        Balances aren't written (replay recomputes them) but, like
+        amounts, must fit in the snapshot's 64-bit columns.
+        """
+        self._write(b''.join([
+            self._pack(number, code, amount, balance)
+            for number, code, amount, balance
+            in zip(count(start), codes, amounts, balances)
+        ]), len(codes), log)
+
+    def record_truncate(self, log, length):
+        """Write a record dropping every transaction from length onward."""
+        self._write(self._RECORD.pack(length, self._TRUNCATE, 0), 1, log)
+
+    def _write(self, data, records, log):
+        # Snapshot before writing: every earlier record has been applied
+        if self.snapshot_every and self._since_snapshot >= self.snapshot_every:
+            self.snapshot(log)
+        self._file.write(data)
+        self._unsynced += records
+        self._since_snapshot += records
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        """Flush buffered records and fsync the write-ahead log."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def snapshot(self, log):
+        """Write log to the snapshot file and empty the write-ahead log."""
+        self.sync()
+        temporary_path = self.snapshot_path + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(self._SNAPSHOT.pack(
+                self._MAGIC,
+                len(log),
+                log._amounts.typecode.encode(),
+                sys.byteorder[0].encode(),
+            ))
+            log._kinds.tofile(file)
+            log._amounts.tofile(file)
+            log._balances.tofile(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.snapshot_path)
+        self._file.truncate(0)
+        self.sync()
+        self._since_snapshot = 0
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+    @classmethod
+    def replay(cls, path):
+        """Return TransactionLog rebuilt from the snapshot and log at path.
+
+        Records numbered below the current log length replace the
+        transactions from that point on, which also makes replaying
+        records already covered by the snapshot harmless.
+        """
+        path = os.fspath(path)
+        log = TransactionLog()
+        if os.path.exists(path + '.snapshot'):
+            with open(path + '.snapshot', 'rb') as file:
+                magic, length, typecode, byteorder = cls._SNAPSHOT.unpack(
+                    file.read(cls._SNAPSHOT.size)
+                )
+                if magic != cls._MAGIC:
+                    raise ValueError(f"{path}.snapshot is not a snapshot")
+                log._amounts = array(typecode.decode())
+                log._balances = array(typecode.decode())
+                for column in (log._kinds, log._amounts, log._balances):
+                    column.fromfile(file, length)
+                    if byteorder.decode() != sys.byteorder[0]:
+                        column.byteswap()
+        if not os.path.exists(path):
+            return log
+        with open(path, 'rb') as file:
+            data = file.read()
+        size = cls._RECORD.size
+        for offset in range(0, len(data) - size + 1, size):
+            number, code, _ = cls._RECORD.unpack_from(data, offset)
+            if number > len(log):
+                raise ValueError(f"{path} is missing transaction {len(log)}")
+            log.truncate(number)
+            if code == cls._TRUNCATE:
+                continue
+            if code & cls._FLOAT:
+                _, code, amount = cls._FLOAT_RECORD.unpack_from(data, offset)
+                code ^= cls._FLOAT
+            else:
+                amount = cls._RECORD.unpack_from(data, offset)[2]
+            kind = TransactionLog.KINDS[code]
+            balance = amount if kind == 'OPEN' else log._balances[-1] + amount
+            log.append(kind, amount, balance)
+        return log
+
+
+class TransactionLog(Sequence):
+    """Append-only log of (kind, amount, balance) transactions.
+
+    Entries are stored in parallel typed arrays and only turned into
+    tuples when they are accessed.  Amounts and balances are stored as
+    64-bit integers until a float is logged, then as doubles.  Any other
+    amount (a Decimal, or an int too big for 64 bits) switches them to
+    lists, so amounts are never rounded.  If a journal is given, every
+    change is written to it before being applied.
+    """
+
+    KINDS = ('OPEN', 'DEPOSIT', 'WITHDRAWAL')
+    _CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+    def __init__(self, journal=None):
+        self.journal = journal
+        self._kinds = array('B')
+        self._amounts = array('q')
+        self._balances = array('q')
+
+    def _widen(self, numbers):
+        """Switch to wider storage if numbers don't fit the current one."""
+        if isinstance(self._amounts, list):
+            return
+        if not all(
+                type(n) is float
+                or type(n) is int and _INT64_MIN <= n <= _INT64_MAX
+                for n in numbers):
+            self._amounts = list(self._amounts)
+            self._balances = list(self._balances)
+        elif self._amounts.typecode == 'q' and not all(
+                type(n) is int for n in numbers):
+            self._amounts = array('d', self._amounts)
+            self._balances = array('d', self._balances)
+
+    def append(self, kind, amount, balance):
+        """Log a single transaction."""
+        if self.journal is not None:
+            self.journal.record(
+                self, len(self), [self._CODES[kind]], [amount], [balance],
+            )
+        self._widen((amount, balance))
+        self._kinds.append(self._CODES[kind])
+        self._amounts.append(amount)
+        self._balances.append(balance)
+
+    def truncate(self, length):
+        """Drop every transaction after the first length transactions."""
+        if self.journal is not None and length < len(self):
+            self.journal.record_truncate(self, length)
+        del self._kinds[length:]
+        del self._amounts[length:]
+        del self._balances[length:]
+
+    def extend(self, kinds, amounts, balances):
+        """Log many transactions given as parallel sequences."""
+        codes = [self._CODES[kind] for kind in kinds]
+        if self.journal is not None:
+            self.journal.record(self, len(self), codes, amounts, balances)
+        self._widen(amounts)
+        self._widen(balances)
+        self._kinds.extend(codes)
+        self._amounts.extend(amounts)
+        self._balances.extend(balances)
+
+    def __len__(self):
+        return len(self._kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return (
+            self.KINDS[self._kinds[index]],
+            self._amounts[index],
+            self._balances[index],
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            mine == theirs
+            for mine, theirs in zip(self, other)
+        )
+
+    def __repr__(self):
+        return f"{type(self).__name__}({list(self)!r})"
+
+
+_account_numbers = count()
+
+
+@contextmanager
+def _locked(*accounts):
+    """Hold the locks of all given accounts, acquired in account order.
+
+    Always locking in the same order means two transfers between the
+    same accounts in opposite directions can never deadlock.
+    """
+    unique = {account._number: account for account in accounts}
+    locks = [unique[number]._lock for number in sorted(unique)]
+    for lock in locks:
+        lock.acquire()
+    try:
+        yield
+    finally:
+        for lock in reversed(locks):
+            lock.release()
 
 
 class BankAccount:
-    """Bank account including an account balance."""
+    """Bank account including an account balance.
+
+    Passing an AccountJournal makes every transaction durable; restore()
+    rebuilds an account from its journal files.
+    """
+
+    def __init__(self, balance=0, journal=None):
+        self._number = next(_account_numbers)
+        self._lock = RLock()
+        self._balance = balance
+        self.transactions = TransactionLog(journal)
+        self.transactions.append('OPEN', balance, balance)
+
+    @classmethod
+    def restore(cls, path, **journal_options):
+        """Return account rebuilt from the journal at path.
+
+        The restored account keeps appending to the same journal.
+        """
+        account = cls.__new__(cls)
+        account._number = next(_account_numbers)
+        account._lock = RLock()
+        account.transactions = AccountJournal.replay(path)
+        if not account.transactions:
+            raise ValueError(f"No transactions found in {path}")
+        account._balance = account.transactions[-1][2]
+        account.transactions.journal = AccountJournal(path, **journal_options)
+        return account
+
+    @property
+    def balance(self):
+        return self._balance
+
+    def deposit(self, amount):
+        """Add amount to the balance."""
+        with self._lock:
+            balance = self._balance + amount
+            self.transactions.append('DEPOSIT', amount, balance)
+            self._balance = balance
+
+    def withdraw(self, amount):
+        """Remove amount from the balance."""
+        with self._lock:
+            balance = self._balance - amount
+            self.transactions.append('WITHDRAWAL', -amount, balance)
+            self._balance = balance
+
+    def withdraw_many(self, amounts):
+        """Remove each amount from the balance in order.
+
+        Every amount is validated before any is applied, so an invalid
+        batch leaves the account unchanged.
+        """
+        amounts = list(amounts)
+        with self._lock:
+            if len(amounts) and min(amounts) < 0:
+                raise ValueError("Cannot withdraw a negative amount")
+            balances = list(accumulate(amounts, sub, initial=self._balance))
+            del balances[0]
+            if not balances:
+                return
+            self.transactions.extend(
+                ['WITHDRAWAL'] * len(amounts),
+                [-amount for amount in amounts],
+                balances,
+            )
+            self._balance = balances[-1]
+
+    def transfer(self, other, amount):
+        """Move amount from this account to other account atomically.
+
+        If either side fails, both accounts are rolled back.
+        """
+        with _locked(self, other):
+            states = [(self, self._checkpoint()), (other, other._checkpoint())]
+            try:
+                self.withdraw(amount)
+                other.deposit(amount)
+            except BaseException:
+                for account, state in reversed(states):
+                    account._rollback(state)
+                raise
+
+    def _checkpoint(self):
+        return self._balance, len(self.transactions)
+
+    def _rollback(self, state):
+        self._balance, length = state
+        self.transactions.truncate(length)
+
+    def post_batch(self, operations):
+        """Apply many ('DEPOSIT' or 'WITHDRAWAL', amount) operations.
+
+        Every operation is validated before any is applied, so an invalid
+        batch leaves the account unchanged.
+        """
+        kinds, amounts, balances = [], [], []
+        with self._lock:
+            balance = self._balance
+            for kind, amount in operations:
+                if amount < 0:
+                    raise ValueError(f"Negative amount in batch: {amount!r}")
+                if kind == 'WITHDRAWAL':
+                    amount = -amount
+                elif kind != 'DEPOSIT':
+                    raise ValueError(f"Unknown transaction kind: {kind!r}")
+                balance += amount
+                kinds.append(kind)
+                amounts.append(amount)
+                balances.append(balance)
+            self.transactions.extend(kinds, amounts, balances)
+            self._balance = balance
+
+    def __repr__(self):
+        return f"{type(self).__name__}(balance={self.balance})"
+
+
+class TransferEngine:
+    """Apply batches of transfers between accounts on worker threads.
+
+    Each transfer locks only its two accounts, so unrelated transfers
+    proceed in parallel.
+    """
+
+    def __init__(self, threads=4):
+        self.threads = threads
+
+    def run(self, transfers):
+        """Apply (source, target, amount) transfers.
+
+        Return a list with None for each transfer that succeeded and the
+        raised exception for each one that failed and was rolled back.
+        """
+        with ThreadPoolExecutor(self.threads) as pool:
+            return list(pool.map(self._transfer, transfers))
+
+    @staticmethod
+    def _transfer(transfer):
+        source, target, amount = transfer
+        try:
+            source.transfer(target, amount)
+        except Exception as error:
+            return error
+        return None
 
 
 class SuperMap:
-    """Data structure for quickly finding objects based on their attributes."""
+    """Data structure for quickly finding objects based on their attributes.
+
+    Each index is either an attribute name or a tuple of attribute names
+    (a composite index).  Lookups by several attributes use whichever
+    indexes cover them, intersecting from the smallest candidate set.
+    Attributes listed in ``ordered`` get a sorted index as well, which
+    answers range, min/max, and top-k queries.  Items with equal values
+    are ordered by id() in it, so add and discard find an item's exact
+    position by bisection; the list insert/delete itself is still an
+    O(n) memory move, which is fast but not constant.
+    """
+
+    def __init__(self, items=(), indexes=(), ordered=()):
+        self._items = set(items)
+        self._shared = set()
+        self._indexes = {}
+        for index in indexes:
+            attrs = (index,) if isinstance(index, str) else tuple(index)
+            self._indexes[attrs] = self._build_index(attrs)
+        self._ordered = {
+            attr: self._build_ordered_index(attr)
+            for attr in ordered
+        }
+
+    def _build_index(self, attrs):
+        index = {}
+        for item in self._items:
+            key = tuple(getattr(item, attr) for attr in attrs)
+            index.setdefault(key, set()).add(item)
+        return index
+
+    def _build_ordered_index(self, attr):
+        """Return parallel lists of sorted attribute values and items."""
+        pairs = sorted(
+            ((getattr(item, attr), item) for item in self._items),
+            key=lambda pair: (pair[0], id(pair[1])),
+        )
+        return [value for value, _ in pairs], [item for _, item in pairs]
+
+    @staticmethod
+    def _ordered_position(values, items, value, item):
+        """Return position of item (or where it goes) in an ordered index."""
+        start = bisect_left(values, value)
+        stop = bisect_right(values, value, start)
+        return bisect_left(items, id(item), start, stop, key=id)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def add(self, item):
+        """Add item to the map, updating every index."""
+        if item in self._items:
+            return
+        self._items.add(item)
+        for attrs, index in self._indexes.items():
+            key = tuple(getattr(item, attr) for attr in attrs)
+            self._writable_posting(index, key).add(item)
+        for attr, (values, items) in self._ordered.items():
+            value = getattr(item, attr)
+            position = self._ordered_position(values, items, value, item)
+            values.insert(position, value)
+            items.insert(position, item)
+
+    def discard(self, item):
+        """Remove item from the map if present, updating every index."""
+        if item not in self._items:
+            return
+        self._items.discard(item)
+        for attrs, index in self._indexes.items():
+            key = tuple(getattr(item, attr) for attr in attrs)
+            matches = self._writable_posting(index, key)
+            matches.discard(item)
+            if not matches:
+                del index[key]
+        for attr, (values, items) in self._ordered.items():
+            value = getattr(item, attr)
+            position = self._ordered_position(values, items, value, item)
+            del values[position]
+            del items[position]
+
+    def _writable_posting(self, index, key):
+        """Return posting set for key, copying it if shared with a fork."""
+        posting = index.get(key)
+        if posting is None:
+            posting = index[key] = set()
+        elif id(posting) in self._shared:
+            posting = index[key] = set(posting)
+        return posting
+
+    def _fork(self):
+        """Return copy which shares posting sets until it changes them.
+
+        The original must not be modified while the copy is in use.
+        """
+        fork = type(self).__new__(type(self))
+        fork._items = set(self._items)
+        fork._indexes = {
+            attrs: dict(index)
+            for attrs, index in self._indexes.items()
+        }
+        fork._shared = {
+            id(posting)
+            for index in self._indexes.values()
+            for posting in index.values()
+        }
+        fork._ordered = {
+            attr: (list(values), list(items))
+            for attr, (values, items) in self._ordered.items()
+        }
+        return fork
+
+    def update_item(self, item, **changes):
+        """Set the given attributes on item and reindex it.
+
+        If setting an attribute fails, the attributes already set are
+        restored and the item is put back before the error is raised.
+        """
+        if item not in self:
+            raise KeyError(item)
+        original = {attr: getattr(item, attr) for attr in changes if hasattr(item, attr)}
+        self.discard(item)
+        changed = []
+        try:
+            for attr, value in changes.items():
+                setattr(item, attr, value)
+                changed.append(attr)
+        except BaseException:
+            for attr in changed:
+                if attr in original:
+                    setattr(item, attr, original[attr])
+                else:
+                    delattr(item, attr)
+            self.add(item)
+            raise
+        self.add(item)
+
+    def replace_item(self, item, **changes):
+        """Replace item with a copy with the given attributes; return it.
+
+        Unlike update_item, item itself is left unchanged.
+        """
+        if item not in self:
+            raise KeyError(item)
+        new_item = copy(item)
+        for attr, value in changes.items():
+            setattr(new_item, attr, value)
+        self.discard(item)
+        self.add(new_item)
+        return new_item
+
+    def extend(self, items):
+        """Add many items, rebuilding indexes if the batch is large."""
+        items = [item for item in items if item not in self._items]
+        if len(items) < len(self._items):
+            for item in items:
+                self.add(item)
+            return
+        self._items.update(items)
+        for attrs in self._indexes:
+            self._indexes[attrs] = self._build_index(attrs)
+        for attr in self._ordered:
+            self._ordered[attr] = self._build_ordered_index(attr)
+
+    def save(self, path):
+        """Write items and indexes to path (see CompactSuperMap.save)."""
+        CompactSuperMap(
+            self._items,
+            indexes=self._indexes,
+            ordered=self._ordered,
+        ).save(path)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """Return CompactSuperMap saved at path."""
+        return CompactSuperMap.load(path, mmap=mmap)
+
+    def cardinality(self, index):
+        """Return the number of distinct keys in the given index."""
+        attrs = (index,) if isinstance(index, str) else tuple(index)
+        return len(self._indexes[attrs])
+
+    def _plan(self, criteria):
+        """Return candidate sets (smallest first) and unindexed attributes."""
+        candidates = []
+        covered = set()
+        for attrs, index in self._indexes.items():
+            if not all(attr in criteria for attr in attrs):
+                continue
+            key = tuple(criteria[attr] for attr in attrs)
+            candidates.append(index.get(key, ()))
+            covered.update(attrs)
+        for attr, (values, items) in self._ordered.items():
+            if attr in criteria and attr not in covered:
+                value = criteria[attr]
+                start = bisect_left(values, value)
+                candidates.append(items[start:bisect_right(values, value)])
+                covered.add(attr)
+        candidates.sort(key=len)
+        return candidates, [a for a in criteria if a not in covered]
+
+    def where(self, *attr_and_value, **criteria):
+        """Return set of items matching all given attribute values.
+
+        Accepts either ``where(attr, value)`` or ``where(attr=value, ...)``.
+        """
+        if attr_and_value:
+            attr, value = attr_and_value
+            index = self._indexes.get((attr,))
+            if index is not None and not criteria:
+                return set(index.get((value,), ()))
+            criteria[attr] = value
+        candidates, unindexed = self._plan(criteria)
+        if not candidates:
+            matches = self._items
+        else:
+            matches = set(candidates[0])
+            for candidate in candidates[1:]:
+                if not matches:
+                    break
+                matches.intersection_update(candidate)
+            if not unindexed:
+                return matches
+        return {
+            item
+            for item in matches
+            if all(getattr(item, a) == criteria[a] for a in unindexed)
+        }
+
+    def where_range(self, attr, lo=None, hi=None):
+        """Return set of items with ``lo <= attr < hi`` (None is unbounded)."""
+        return set(self._ordered_slice(attr, *self._range_bounds(attr, lo, hi)))
+
+    def _range_bounds(self, attr, lo, hi):
+        values, _ = self._ordered[attr]
+        start = 0 if lo is None else bisect_left(values, lo)
+        stop = len(values) if hi is None else bisect_left(values, hi)
+        return start, stop
+
+    def _ordered_slice(self, attr, start=None, stop=None, step=None):
+        """Return list of items from the given slice of an ordered index."""
+        _, items = self._ordered[attr]
+        return items[start:stop:step]
+
+    def min(self, attr):
+        """Return an item with the smallest value for the given attribute."""
+        items = self._ordered_slice(attr, None, 1)
+        if not items:
+            raise ValueError("min() of empty SuperMap")
+        return items[0]
+
+    def max(self, attr):
+        """Return an item with the largest value for the given attribute."""
+        items = self._ordered_slice(attr, -1, None)
+        if not items:
+            raise ValueError("max() of empty SuperMap")
+        return items[0]
+
+    def nsmallest(self, attr, k):
+        """Return list of the k items with the smallest attribute values."""
+        return self._ordered_slice(attr, None, max(k, 0))
+
+    def nlargest(self, attr, k):
+        """Return list of the k items with the largest attribute values."""
+        if k <= 0:
+            return []
+        return self._ordered_slice(attr, None, -k-1, -1)
+
+
+_BYTE_BITS = [
+    tuple(bit for bit in range(8) if byte >> bit & 1)
+    for byte in range(256)
+]
+
+
+def _bitmap_rows(bitmap):
+    """Yield the row ids of the bits set in an int or bytes-like bitmap."""
+    if isinstance(bitmap, int):
+        bitmap = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(bitmap):
+        if byte:
+            base = byte_index * 8
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+
+def _is_bitmap(posting):
+    """Return True if posting is a bitmap rather than an array of row ids."""
+    if isinstance(posting, memoryview):
+        return posting.format == 'B'
+    return isinstance(posting, bytearray)
+
+
+class RowSet(Set):
+    """Lazily materialized set of items referenced by row ids.
+
+    The ids are a bitmap int or a sorted sequence of row ids.
+    """
+
+    def __init__(self, mapping, ids):
+        self._mapping = mapping
+        self._ids = ids
+
+    def __iter__(self):
+        ids = self._ids
+        if isinstance(ids, int):
+            ids = _bitmap_rows(ids)
+        return map(self._mapping._rows.__getitem__, ids)
+
+    def __len__(self):
+        if isinstance(self._ids, int):
+            return bin(self._ids).count('1')
+        return len(self._ids)
+
+    def __contains__(self, item):
+        row = self._mapping._row_ids.get(item)
+        if row is None:
+            return False
+        if isinstance(self._ids, int):
+            return bool(self._ids >> row & 1)
+        return _sorted_contains(self._ids, row)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({set(self)!r})"
+
+
+class CompactSuperMap(SuperMap):
+    """SuperMap which stores index postings as compact row id lists.
+
+    Every item gets an integer row id.  Postings are ``array('I')`` row
+    ids until they cover one in every 32 rows, then they become bitmaps,
+    so intersecting low-cardinality attributes is a bitwise AND.  Query
+    results are RowSets which look items up only when iterated; they
+    are only valid until the map is next modified.
+
+    Maps can be saved to a flat binary file and loaded back with their
+    postings memory-mapped, so no index has to be rebuilt at startup.
+    """
+
+    _MAGIC = b'SUPERMAP'
+
+    def __init__(self, items=(), indexes=(), ordered=()):
+        self._rows = []
+        self._row_ids = {}
+        self._append_rows(items)
+        self._indexes = {}
+        for index in indexes:
+            attrs = (index,) if isinstance(index, str) else tuple(index)
+            self._indexes[attrs] = self._build_index(attrs)
+        self._ordered = {
+            attr: self._build_ordered_index(attr)
+            for attr in ordered
+        }
+
+    def _append_rows(self, items):
+        for item in items:
+            if item not in self._row_ids:
+                self._row_ids[item] = len(self._rows)
+                self._rows.append(item)
+
+    def _dense(self, posting):
+        """Return True if posting is large enough to store as a bitmap."""
+        return len(posting) * 32 >= len(self._rows)
+
+    def _to_bitmap(self, posting):
+        bitmap = bytearray((len(self._rows) + 7) // 8)
+        for row in posting:
+            bitmap[row >> 3] |= 1 << (row & 7)
+        return bitmap
+
+    def _build_index(self, attrs):
+        index = {}
+        for item, row in self._row_ids.items():
+            key = tuple(getattr(item, attr) for attr in attrs)
+            index.setdefault(key, array('I')).append(row)
+        for key, posting in index.items():
+            if self._dense(posting):
+                index[key] = self._to_bitmap(posting)
+            else:
+                index[key] = array('I', sorted(posting))
+        return index
+
+    def _build_ordered_index(self, attr):
+        """Return parallel sorted attribute values and row ids."""
+        pairs = sorted(
+            ((getattr(item, attr), row) for item, row in self._row_ids.items()),
+            key=lambda pair: pair[0],
+        )
+        return [value for value, _ in pairs], array('I', [r for _, r in pairs])
+
+    def __getattr__(self, name):
+        # Loaded maps only build the item to row id mapping when needed
+        if name != '_row_ids':
+            raise AttributeError(name)
+        self._row_ids = {
+            item: row
+            for row, item in enumerate(self._rows)
+            if item is not None
+        }
+        return self._row_ids
+
+    def __len__(self):
+        return len(self._row_ids)
+
+    def __contains__(self, item):
+        return item in self._row_ids
+
+    def _writable_posting(self, index, key):
+        """Return posting for key, copying it if it is memory-mapped."""
+        posting = index[key]
+        if isinstance(posting, memoryview):
+            if posting.format == 'B':
+                posting = bytearray(posting)
+            else:
+                posting = array('I', posting)
+            index[key] = posting
+        return posting
+
+    def _writable_ordered(self, attr):
+        """Return ordered index for attr, copying it if memory-mapped."""
+        values, rows = self._ordered[attr]
+        if isinstance(rows, memoryview):
+            rows = array('I', rows)
+            self._ordered[attr] = values, rows
+        return values, rows
+
+    def add(self, item):
+        """Add item to the map, updating every index."""
+        if item in self._row_ids:
+            return
+        row = len(self._rows)
+        self._row_ids[item] = row
+        self._rows.append(item)
+        for attrs, index in self._indexes.items():
+            key = tuple(getattr(item, attr) for attr in attrs)
+            if key not in index:
+                index[key] = array('I', [row])
+                continue
+            posting = self._writable_posting(index, key)
+            if isinstance(posting, bytearray):
+                if row >> 3 >= len(posting):
+                    posting.extend(bytes(row // 8 + 1 - len(posting)))
+                posting[row >> 3] |= 1 << (row & 7)
+            else:
+                posting.append(row)
+                if self._dense(posting):
+                    index[key] = self._to_bitmap(posting)
+        for attr in self._ordered:
+            values, rows = self._writable_ordered(attr)
+            value = getattr(item, attr)
+            position = bisect_right(values, value)
+            values.insert(position, value)
+            rows.insert(position, row)
+
+    def discard(self, item):
+        """Remove item from the map if present, updating every index.
+
+        The row id is not reused; extend() renumbers rows when it rebuilds.
+        """
+        row = self._row_ids.pop(item, None)
+        if row is None:
+            return
+        self._rows[row] = None
+        for attrs, index in self._indexes.items():
+            key = tuple(getattr(item, attr) for attr in attrs)
+            posting = self._writable_posting(index, key)
+            if isinstance(posting, bytearray):
+                posting[row >> 3] &= ~(1 << (row & 7))
+                if posting.count(0) == len(posting):
+                    del index[key]
+            else:
+                del posting[bisect_left(posting, row)]
+                if not posting:
+                    del index[key]
+        for attr in self._ordered:
+            values, rows = self._writable_ordered(attr)
+            value = getattr(item, attr)
+            # Equal values are in row id order, so the row can be bisected
+            start = bisect_left(values, value)
+            stop = bisect_right(values, value, start)
+            position = bisect_left(rows, row, start, stop)
+            del values[position]
+            del rows[position]
+
+    def extend(self, items):
+        """Add many items, renumbering rows and rebuilding if large."""
+        items = [item for item in items if item not in self._row_ids]
+        if len(items) < len(self._row_ids):
+            for item in items:
+                self.add(item)
+            return
+        live = list(self._row_ids)
+        self._rows = []
+        self._row_ids = {}
+        self._append_rows(live + items)
+        for attrs in self._indexes:
+            self._indexes[attrs] = self._build_index(attrs)
+        for attr in self._ordered:
+            self._ordered[attr] = self._build_ordered_index(attr)
+
+    def _plan(self, criteria):
+        """Return postings (arrays first, smallest first) and unindexed."""
+        candidates = []
+        covered = set()
+        for attrs, index in self._indexes.items():
+            if not all(attr in criteria for attr in attrs):
+                continue
+            key = tuple(criteria[attr] for attr in attrs)
+            candidates.append(index.get(key, array('I')))
+            covered.update(attrs)
+        for attr, (values, rows) in self._ordered.items():
+            if attr in criteria and attr not in covered:
+                value = criteria[attr]
+                start = bisect_left(values, value)
+                stop = bisect_right(values, value)
+                candidates.append(array('I', sorted(rows[start:stop])))
+                covered.add(attr)
+        candidates.sort(key=lambda posting: (
+            _is_bitmap(posting),
+            len(posting),
+        ))
+        return candidates, [a for a in criteria if a not in covered]
+
+    def where(self, *attr_and_value, **criteria):
+        """Return RowSet of items matching all given attribute values.
+
+        Accepts either ``where(attr, value)`` or ``where(attr=value, ...)``.
+        """
+        if attr_and_value:
+            attr, value = attr_and_value
+            criteria[attr] = value
+        candidates, unindexed = self._plan(criteria)
+        if not candidates:
+            ids = array('I', self._row_ids.values())
+        elif _is_bitmap(candidates[0]):
+            ids = int.from_bytes(candidates[0], 'little')
+            for posting in candidates[1:]:
+                ids &= int.from_bytes(posting, 'little')
+        else:
+            ids = candidates[0]
+            for posting in candidates[1:]:
+                if not ids:
+                    break
+                if _is_bitmap(posting):
+                    size = len(posting)
+                    ids = array('I', [
+                        row
+                        for row in ids
+                        if row >> 3 < size and posting[row >> 3] >> (row & 7) & 1
+                    ])
+                else:
+                    ids = array('I', [
+                        row
+                        for row in ids
+                        if _sorted_contains(posting, row)
+                    ])
+        if unindexed:
+            rows = self._rows
+            if isinstance(ids, int):
+                ids = _bitmap_rows(ids)
+            ids = array('I', [
+                row
+                for row in ids
+                if all(getattr(rows[row], a) == criteria[a] for a in unindexed)
+            ])
+        return RowSet(self, ids)
+
+    def where_range(self, attr, lo=None, hi=None):
+        """Return RowSet of items with ``lo <= attr < hi``."""
+        start, stop = self._range_bounds(attr, lo, hi)
+        _, rows = self._ordered[attr]
+        return RowSet(self, array('I', sorted(rows[start:stop])))
+
+    def _ordered_slice(self, attr, start=None, stop=None, step=None):
+        """Return list of items from the given slice of an ordered index."""
+        _, rows = self._ordered[attr]
+        return [self._rows[row] for row in rows[start:stop:step]]
+
+    def save(self, path):
+        """Write items and indexes to path in a flat binary format.
+
+        Postings are written as raw row id arrays and bitmaps, followed
+        by a pickled header of items, index keys, and posting offsets.
+        The file is written to a temporary path and then renamed over
+        path, so a map memory-mapped from path can be saved back to it.
+        """
+        temporary_path = os.fspath(path) + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(self._MAGIC + bytes(8))
+
+            def write(posting):
+                file.write(bytes(-file.tell() % 8))
+                offset = file.tell()
+                file.write(posting)
+                return offset, file.tell() - offset
+
+            indexes = {
+                attrs: [
+                    (key, _is_bitmap(posting), *write(posting))
+                    for key, posting in index.items()
+                ]
+                for attrs, index in self._indexes.items()
+            }
+            ordered = {
+                attr: (values, *write(rows))
+                for attr, (values, rows) in self._ordered.items()
+            }
+            header_offset = file.tell()
+            pickle.dump({
+                'byteorder': sys.byteorder,
+                'itemsize': array('I').itemsize,
+                'rows': self._rows,
+                'indexes': indexes,
+                'ordered': ordered,
+            }, file)
+            file.seek(len(self._MAGIC))
+            file.write(header_offset.to_bytes(8, 'little'))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Return map saved at path, memory-mapping postings by default."""
+        with open(path, 'rb') as file:
+            if mmap:
+                buffer = memory_map(file.fileno(), 0, access=ACCESS_READ)
+            else:
+                buffer = file.read()
+        view = memoryview(buffer)
+        if view[:len(cls._MAGIC)] != cls._MAGIC:
+            raise ValueError(f"{path} is not a saved SuperMap")
+        start = len(cls._MAGIC)
+        header = pickle.loads(view[int.from_bytes(view[start:start+8], 'little'):])
+        if (header['byteorder'], header['itemsize']) != (
+                sys.byteorder, array('I').itemsize):
+            raise ValueError(f"{path} was saved on an incompatible platform")
+        mapping = cls.__new__(cls)
+        mapping._buffer = buffer
+        mapping._rows = header['rows']
+        mapping._indexes = {
+            attrs: {
+                key: (
+                    view[offset:offset+size] if bitmap
+                    else view[offset:offset+size].cast('I')
+                )
+                for key, bitmap, offset, size in postings
+            }
+            for attrs, postings in header['indexes'].items()
+        }
+        mapping._ordered = {
+            attr: (values, view[offset:offset+size].cast('I'))
+            for attr, (values, offset, size) in header['ordered'].items()
+        }
+        return mapping
+
+
+class VersionedSuperMap:
+    """SuperMap whose readers always see a consistent snapshot.
+
+    Writers change a private fork of the current generation inside
+    batch() and publish it in a single assignment when the batch ends,
+    so queries never wait on writers and never see half-applied changes.
+    Forking copies the item set, every index dict, and every ordered
+    list (only posting sets are shared), so each batch costs O(n) on
+    top of its changes: group changes into as few batches as possible.
+    Replace items (see SuperMap.replace_item) rather than mutating them,
+    so older snapshots held by readers stay valid.
+    """
+
+    _QUERIES = frozenset({
+        'where', 'where_range', 'min', 'max', 'nsmallest', 'nlargest',
+        'cardinality', 'save',
+    })
+
+    def __init__(self, items=(), indexes=(), ordered=()):
+        self._snapshot = SuperMap(items, indexes=indexes, ordered=ordered)
+        self._lock = Lock()
+        self.generation = 0
+
+    def __getattr__(self, name):
+        if name in self._QUERIES:
+            return getattr(self._snapshot, name)
+        raise AttributeError(
+            f"{type(self).__name__!r} object has no attribute {name!r}"
+        )
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __contains__(self, item):
+        return item in self._snapshot
+
+    def snapshot(self):
+        """Return the current generation (which must not be modified)."""
+        return self._snapshot
+
+    @contextmanager
+    def batch(self):
+        """Yield a writable SuperMap published when the block exits.
+
+        Nothing is published if the block raises an exception.
+        """
+        with self._lock:
+            working = self._snapshot._fork()
+            yield working
+            self._snapshot = working
+            self.generation += 1
+
+
+def _sorted_contains(values, value):
+    """Return True if value is in the sorted sequence values."""
+    position = bisect_left(values, value)
+    return position < len(values) and values[position] == value
+
+
+class _BinaryHeap:
+    """Binary heap engine backed by heapq."""
+
+    def __init__(self, items=()):
+        self._data = list(items)
+        self._heapify()
+
+    def _heapify(self):
+        heapify(self._data)
+
+    def _children(self, index):
+        return range(2 * index + 1, min(2 * index + 3, len(self._data)))
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def clear(self):
+        self._data = []
+
+    def peek(self):
+        return self._data[0]
+
+    def push(self, item):
+        heappush(self._data, item)
+
+    def pop(self):
+        return heappop(self._data)
+
+    def pushpop(self, item):
+        return heappushpop(self._data, item)
+
+    def replace(self, item):
+        return heapreplace(self._data, item)
+
+    def push_many(self, items):
+        items = list(items)
+        size, k = len(self._data), len(items)
+        # Heapify costs O(size + k); pushing one at a time O(k log size)
+        if size <= k or k * size.bit_length() > size + k:
+            self._data.extend(items)
+            self._heapify()
+        else:
+            for item in items:
+                self.push(item)
+
+    def pop_many(self, k):
+        return [self.pop() for _ in range(min(k, len(self)))]
+
+    def nsmallest(self, k):
+        data = self._data
+        result = []
+        frontier = [(data[0], 0)] if data else []
+        while frontier and len(result) < k:
+            item, index = heappop(frontier)
+            result.append(item)
+            for child in self._children(index):
+                heappush(frontier, (data[child], child))
+        return result
+
+    def merge(self, other):
+        self.push_many(other)
+        other.clear()
+
+
+class _DaryHeap(_BinaryHeap):
+    """Array-backed heap engine where each node has d children."""
+
+    def __init__(self, items=(), d=4):
+        self._d = d
+        super().__init__(items)
+
+    def _heapify(self):
+        for index in reversed(range((len(self._data) - 2) // self._d + 1)):
+            self._sift_down(index)
+
+    def _children(self, index):
+        first = self._d * index + 1
+        return range(first, min(first + self._d, len(self._data)))
+
+    def _sift_up(self, index):
+        data, d = self._data, self._d
+        item = data[index]
+        while index:
+            parent = (index - 1) // d
+            if not item < data[parent]:
+                break
+            data[index] = data[parent]
+            index = parent
+        data[index] = item
+
+    def _sift_down(self, index):
+        data = self._data
+        item = data[index]
+        while True:
+            children = self._children(index)
+            if not children:
+                break
+            child = min(children, key=data.__getitem__)
+            if not data[child] < item:
+                break
+            data[index] = data[child]
+            index = child
+        data[index] = item
+
+    def push(self, item):
+        self._data.append(item)
+        self._sift_up(len(self._data) - 1)
+
+    def pop(self):
+        data = self._data
+        last = data.pop()
+        if not data:
+            return last
+        smallest, data[0] = data[0], last
+        self._sift_down(0)
+        return smallest
+
+    def pushpop(self, item):
+        data = self._data
+        if data and data[0] < item:
+            item, data[0] = data[0], item
+            self._sift_down(0)
+        return item
+
+    def replace(self, item):
+        data = self._data
+        smallest, data[0] = data[0], item
+        self._sift_down(0)
+        return smallest
+
+
+class _ArrayHeap(_DaryHeap):
+    """Binary heap engine storing numbers unboxed in an array.
+
+    Construction and bulk pushes extend the array and sift down from the
+    bottom up in place, so numbers are never all boxed at once.  Large
+    pop_many() calls find the kth smallest number by quickselect over
+    filtered arrays, then only the k smallest are boxed to be sorted and
+    the rest are filtered into a new array and heapified.
+    """
+
+    def __init__(self, items=(), dtype='d'):
+        self._d = 2
+        self._data = array(dtype, items)
+        self._heapify()
+
+    def _sift_down(self, index):
+        data = self._data
+        end = len(data)
+        item = data[index]
+        child = 2 * index + 1
+        while child < end:
+            if child + 1 < end and data[child + 1] < data[child]:
+                child += 1
+            if not data[child] < item:
+                break
+            data[index] = data[child]
+            index = child
+            child = 2 * index + 1
+        data[index] = item
+
+    def clear(self):
+        self._data = array(self._data.typecode)
+
+    def push_many(self, items):
+        data = self._data
+        size = len(data)
+        try:
+            data.extend(items)
+        except BaseException:
+            del data[size:]
+            raise
+        k = len(data) - size
+        if size <= k or k * size.bit_length() > size + k:
+            self._heapify()
+        else:
+            for index in range(size, len(data)):
+                self._sift_up(index)
+
+    def pop_many(self, k):
+        data = self._data
+        # Each pop sifts in Python, costing about as much as heapifying
+        # eight items
+        if k * 8 < len(data):
+            return array(data.typecode, super().pop_many(k))
+        if k >= len(data):
+            smallest = array(data.typecode, sorted(data))
+            self.clear()
+            return smallest
+        largest = self._select(data, k)
+        smallest = array(data.typecode, sorted(filter(largest.__gt__, data)))
+        ties = k - len(smallest)
+        smallest.extend(repeat(largest, ties))
+        self._data = array(data.typecode, filter(largest.__lt__, data))
+        self._data.extend(repeat(largest, data.count(largest) - ties))
+        self._heapify()
+        return smallest
+
+    @staticmethod
+    def _select(values, k):
+        """Return the kth smallest number (counting from 1) in values."""
+        while True:
+            pivot = choice(values)
+            below = array(values.typecode, filter(pivot.__gt__, values))
+            if k <= len(below):
+                values = below
+                continue
+            k -= len(below) + values.count(pivot)
+            if k <= 0:
+                return pivot
+            values = array(values.typecode, filter(pivot.__lt__, values))
+
+
+class _PairingHeap:
+    """Pairing heap engine: O(1) push and merge, amortized O(log n) pop.
+
+    Nodes are ``[item, children]`` lists.
+    """
+
+    def __init__(self, items=()):
+        self._root = None
+        self._size = 0
+        self.push_many(items)
+
+    @staticmethod
+    def _meld(a, b):
+        if b[0] < a[0]:
+            a, b = b, a
+        a[1].append(b)
+        return a
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        stack = [self._root] if self._root else []
+        while stack:
+            item, children = stack.pop()
+            yield item
+            stack.extend(children)
+
+    def clear(self):
+        self._root = None
+        self._size = 0
+
+    def peek(self):
+        if self._root is None:
+            raise IndexError("peek at empty heap")
+        return self._root[0]
+
+    def push(self, item):
+        node = [item, []]
+        self._root = node if self._root is None else self._meld(self._root, node)
+        self._size += 1
+
+    def pop(self):
+        if self._root is None:
+            raise IndexError("pop from empty heap")
+        item, children = self._root
+        paired = [
+            self._meld(children[i], children[i+1])
+            for i in range(0, len(children) - 1, 2)
+        ]
+        if len(children) % 2:
+            paired.append(children[-1])
+        root = paired.pop() if paired else None
+        while paired:
+            root = self._meld(paired.pop(), root)
+        self._root = root
+        self._size -= 1
+        return item
+
+    def pushpop(self, item):
+        if self._root is None or not self._root[0] < item:
+            return item
+        self.push(item)
+        return self.pop()
+
+    def replace(self, item):
+        smallest = self.pop()
+        self.push(item)
+        return smallest
+
+    def push_many(self, items):
+        for item in items:
+            self.push(item)
+
+    def pop_many(self, k):
+        return [self.pop() for _ in range(min(k, len(self)))]
+
+    def nsmallest(self, k):
+        result = []
+        frontier = [(self._root[0], 0, self._root)] if self._root else []
+        count = 1
+        while frontier and len(result) < k:
+            item, _, node = heappop(frontier)
+            result.append(item)
+            for child in node[1]:
+                heappush(frontier, (child[0], count, child))
+                count += 1
+        return result
+
+    def merge(self, other):
+        if not isinstance(other, _PairingHeap):
+            self.push_many(other)
+        elif other._root is not None:
+            if self._root is None:
+                self._root = other._root
+            else:
+                self._root = self._meld(self._root, other._root)
+            self._size += other._size
+        other.clear()
 
 
 class MinHeap:
-    """Heap-like data structure."""
+    """Heap-like data structure.
+
+    The engine behind the heap is chosen with ``backend``: 'binary'
+    (heapq, the default), 'dary' (4-ary), or 'pairing' (constant-time
+    push and merge).  heapq's sifting is written in C, so 'binary' is
+    the fastest for pushes and pops alike; the pure-Python 'dary' and
+    'pairing' engines are several times slower and only worth it when
+    their structure is (e.g. merging pairing heaps).  Giving an
+    ``array`` typecode as ``dtype`` (e.g. 'd' or 'q') stores numbers
+    unboxed in a contiguous array instead, trading speed (it sifts in
+    Python) for a fraction of the memory.
+    """
+
+    _BACKENDS = {
+        'binary': _BinaryHeap,
+        'dary': _DaryHeap,
+        'pairing': _PairingHeap,
+    }
+
+    def __init__(self, iterable=(), backend='binary', dtype=None):
+        if backend not in self._BACKENDS:
+            raise ValueError(f"Unknown heap backend: {backend!r}")
+        self.backend = backend
+        self.dtype = dtype
+        if dtype is None:
+            self._heap = self._BACKENDS[backend](iterable)
+        elif backend == 'binary':
+            self._heap = _ArrayHeap(iterable, dtype)
+        else:
+            raise ValueError("dtype is only supported by the binary backend")
+
+    def __len__(self):
+        return len(self._heap)
+
+    def peek(self):
+        """Return the smallest item without removing it."""
+        return self._heap.peek()
+
+    def push(self, item):
+        """Add item to the heap."""
+        self._heap.push(item)
+
+    def pop(self):
+        """Remove and return the smallest item."""
+        return self._heap.pop()
+
+    def pushpop(self, item):
+        """Push item, then pop and return the smallest item."""
+        return self._heap.pushpop(item)
+
+    def replace(self, item):
+        """Pop and return the smallest item, then push item."""
+        return self._heap.replace(item)
+
+    def push_many(self, items):
+        """Add all given items, re-heapifying once if the batch is large."""
+        self._heap.push_many(items)
+
+    def pop_many(self, k):
+        """Remove and return the k smallest items in sorted order.
+
+        Typed heaps return an array rather than a list.
+        """
+        return self._heap.pop_many(k)
+
+    def nsmallest(self, k):
+        """Return sorted list of the k smallest items, leaving heap intact."""
+        return self._heap.nsmallest(k)
+
+    def merge(self, other):
+        """Move all items from other MinHeap into this one."""
+        if other is self:
+            raise ValueError("Cannot merge a heap with itself")
+        self._heap.merge(other._heap)
+
+
+class IndexedMinHeap:
+    """Min-heap of unique items whose priorities can change.
+
+    Each item's priority is key(item) (the item itself by default) unless
+    set explicitly.  A position map makes update_priority() and remove()
+    O(log n) instead of leaving stale entries in the heap.
+    """
+
+    def __init__(self, iterable=(), key=None):
+        self._key = key
+        self._items = []
+        self._keys = []
+        self._positions = {}
+        for item in iterable:
+            if item in self._positions:
+                raise ValueError(f"{item!r} is already in the heap")
+            self._positions[item] = len(self._items)
+            self._items.append(item)
+            self._keys.append(item if key is None else key(item))
+        for index in reversed(range(len(self._items) // 2)):
+            self._sift_down(index)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def priority(self, item):
+        """Return the current priority of item."""
+        return self._keys[self._positions[item]]
+
+    def peek(self):
+        """Return the item with the smallest priority without removing it."""
+        return self._items[0]
+
+    def push(self, item, priority=None):
+        """Add item, with key(item) as its priority unless one is given."""
+        if item in self._positions:
+            raise ValueError(f"{item!r} is already in the heap")
+        if priority is None:
+            priority = item if self._key is None else self._key(item)
+        self._positions[item] = len(self._items)
+        self._items.append(item)
+        self._keys.append(priority)
+        self._sift_up(len(self._items) - 1)
+
+    def pop(self):
+        """Remove and return the item with the smallest priority."""
+        item = self._items[0]
+        self._remove_at(0)
+        return item
+
+    def remove(self, item):
+        """Remove item from the heap."""
+        self._remove_at(self._positions[item])
+
+    def update_priority(self, item, new_key):
+        """Change the priority of item and restore the heap order."""
+        index = self._positions[item]
+        old_key = self._keys[index]
+        self._keys[index] = new_key
+        if new_key < old_key:
+            self._sift_up(index)
+        else:
+            self._sift_down(index)
+
+    def _remove_at(self, index):
+        items, keys = self._items, self._keys
+        del self._positions[items[index]]
+        last_item, last_key = items.pop(), keys.pop()
+        if index == len(items):
+            return
+        items[index], keys[index] = last_item, last_key
+        self._positions[last_item] = index
+        self._sift_up(index)
+        self._sift_down(self._positions[last_item])
+
+    def _move(self, item, key, index):
+        self._items[index] = item
+        self._keys[index] = key
+        self._positions[item] = index
+
+    def _sift_up(self, index):
+        items, keys = self._items, self._keys
+        item, key = items[index], keys[index]
+        while index > 0:
+            parent = (index - 1) // 2
+            if not key < keys[parent]:
+                break
+            self._move(items[parent], keys[parent], index)
+            index = parent
+        self._move(item, key, index)
+
+    def _sift_down(self, index):
+        items, keys = self._items, self._keys
+        item, key = items[index], keys[index]
+        size = len(items)
+        while True:
+            child = 2 * index + 1
+            if child >= size:
+                break
+            if child + 1 < size and keys[child + 1] < keys[child]:
+                child += 1
+            if not keys[child] < key:
+                break
+            self._move(items[child], keys[child], index)
+            index = child
+        self._move(item, key, index)
+
+
+class _Ingredients(list):
+    """List of a flavor's ingredients which reindexes it when mutated."""
+
+    __slots__ = ('_flavor',)
+
+    def __init__(self, flavor, ingredients=()):
+        super().__init__(ingredients)
+        self._flavor = flavor
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+    def append(self, ingredient):
+        super().append(ingredient)
+        self._flavor._reindex()
+
+    def extend(self, ingredients):
+        super().extend(ingredients)
+        self._flavor._reindex()
+
+    def insert(self, index, ingredient):
+        super().insert(index, ingredient)
+        self._flavor._reindex()
+
+    def remove(self, ingredient):
+        super().remove(ingredient)
+        self._flavor._reindex()
+
+    def pop(self, index=-1):
+        ingredient = super().pop(index)
+        self._flavor._reindex()
+        return ingredient
+
+    def clear(self):
+        super().clear()
+        self._flavor._reindex()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._flavor._reindex()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._flavor._reindex()
+
+    def __iadd__(self, ingredients):
+        super().__iadd__(ingredients)
+        self._flavor._reindex()
+        return self
+
+    def __imul__(self, count):
+        super().__imul__(count)
+        self._flavor._reindex()
+        return self
 
 
 class Flavor:
-    """Flavor of ice cream."""
+    """Flavor of ice cream.
+
+    Changes to ingredients (including in-place list changes) and to
+    has_dairy are passed on to any FlavorCatalogs and Menus containing
+    the flavor.  Flavors only hold weak references to those, so they
+    don't keep catalogs or menus alive.
+    """
+
+    def __init__(self, name, ingredients=(), has_dairy=True):
+        self.name = name
+        self._catalogs = WeakSet()
+        self.ingredients = ingredients
+        self.has_dairy = has_dairy
+
+    @property
+    def ingredients(self):
+        return self._ingredients
+
+    @ingredients.setter
+    def ingredients(self, ingredients):
+        self._ingredients = _Ingredients(self, ingredients)
+        self._reindex()
+
+    @property
+    def has_dairy(self):
+        return self._has_dairy
+
+    @has_dairy.setter
+    def has_dairy(self, has_dairy):
+        self._has_dairy = has_dairy
+        self._reindex()
+
+    def _reindex(self):
+        for catalog in self._catalogs:
+            catalog._reindex(self)
+
+    def __reduce__(self):
+        return (type(self), (self.name, list(self.ingredients), self.has_dairy))
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}(name={self.name!r}, "
+            f"ingredients={self.ingredients!r}, has_dairy={self.has_dairy!r})"
+        )
 
 
 class Size:
     """Ice cream size."""
 
+    def __init__(self, quantity, unit, price):
+        self.quantity = quantity
+        self.unit = unit
+        self.price = price
+
+    def __str__(self):
+        plural = "" if self.quantity == 1 else "s"
+        return f"{self.quantity} {self.unit}{plural}"
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}(quantity={self.quantity!r}, "
+            f"unit={self.unit!r}, price={self.price!r})"
+        )
+
 
 class IceCream:
     """Ice cream to be ordered in our ice cream shop."""
 
+    def __init__(self, flavor, size):
+        self.flavor = flavor
+        self.size = size
+
+    def __str__(self):
+        return f"{self.size} of {self.flavor.name}"
+
+
+class Menu:
+    """Registry of interned flavors, sizes, and ice creams.
+
+    Flavors are interned by name and sizes by (quantity, unit).  Every
+    (flavor, size) combination gets a precomputed price and an allergen
+    bitset (bit 0 is dairy, then one bit per name in allergens), so
+    pricing or screening a batch of orders is one dict lookup per order.
+    Flavors notify the menu when their ingredients or has_dairy change,
+    and the bitsets of that flavor's combinations are recomputed.
+    """
+
+    def __init__(self, flavors=(), sizes=(), allergens=()):
+        self.allergens = ('dairy', *allergens)
+        self.flavors = {}
+        self.sizes = {}
+        # Maps interned IceCreams and (flavor, size) pairs to table rows
+        self._combinations = {}
+        self._ice_creams = []
+        self._flavor_rows = {}
+        self._prices = []
+        self._allergen_bits = []
+        for flavor in flavors:
+            self.add_flavor(flavor)
+        for size in sizes:
+            self.add_size(size)
+
+    @staticmethod
+    def _parse_price(price):
+        try:
+            return Decimal(str(price).lstrip('$'))
+        except InvalidOperation:
+            raise ValueError(f"Invalid price: {price!r}") from None
+
+    def _flavor_bits(self, flavor):
+        ingredients = set(flavor.ingredients)
+        bits = int(bool(flavor.has_dairy))
+        for bit, allergen in enumerate(self.allergens[1:], start=1):
+            if allergen in ingredients:
+                bits |= 1 << bit
+        return bits
+
+    def _add_combination(self, flavor, size):
+        ice_cream = IceCream(flavor, size)
+        index = len(self._ice_creams)
+        self._combinations[ice_cream] = index
+        self._combinations[flavor, size] = index
+        self._ice_creams.append(ice_cream)
+        self._flavor_rows[flavor].append(index)
+        self._prices.append(self._parse_price(size.price))
+        self._allergen_bits.append(self._flavor_bits(flavor))
+
+    def add_flavor(self, flavor):
+        """Add flavor unless one with its name exists; return the menu's."""
+        existing = self.flavors.get(flavor.name)
+        if existing is not None:
+            return existing
+        self.flavors[flavor.name] = flavor
+        self._flavor_rows[flavor] = []
+        flavor._catalogs.add(self)
+        for size in self.sizes.values():
+            self._add_combination(flavor, size)
+        return flavor
+
+    def remove_flavor(self, flavor_name):
+        """Remove the named flavor and its combinations; return it.
+
+        The flavor stops notifying the menu.  Its table rows are left
+        unused rather than renumbering every other combination.
+        """
+        flavor = self.flavors.pop(flavor_name)
+        flavor._catalogs.discard(self)
+        for index in self._flavor_rows.pop(flavor):
+            ice_cream = self._ice_creams[index]
+            del self._combinations[ice_cream]
+            del self._combinations[flavor, ice_cream.size]
+            self._ice_creams[index] = None
+        return flavor
+
+    def _reindex(self, flavor):
+        bits = self._flavor_bits(flavor)
+        for index in self._flavor_rows[flavor]:
+            self._allergen_bits[index] = bits
+
+    def add_size(self, size):
+        """Add size unless an equal one exists; return the menu's."""
+        key = (size.quantity, size.unit)
+        existing = self.sizes.get(key)
+        if existing is not None:
+            return existing
+        self.sizes[key] = size
+        for flavor in self.flavors.values():
+            self._add_combination(flavor, size)
+        return size
+
+    def ice_cream(self, flavor_name, quantity, unit):
+        """Return the interned IceCream for the given flavor and size."""
+        flavor = self.flavors[flavor_name]
+        size = self.sizes[quantity, unit]
+        return self._ice_creams[self._combinations[flavor, size]]
+
+    def _combination(self, order):
+        index = self._combinations.get(order)
+        if index is None:
+            index = self._combinations[order.flavor, order.size]
+        return index
+
+    def price(self, order):
+        """Return the Decimal price of an IceCream on this menu."""
+        return self._prices[self._combination(order)]
+
+    def price_orders(self, batch):
+        """Return list of Decimal prices for an iterable of IceCreams."""
+        prices = self._prices
+        return [prices[index] for index in map(self._combination, batch)]
+
+    def allergens_in(self, order):
+        """Return set of allergen names (including 'dairy') in order."""
+        bits = self._allergen_bits[self._combination(order)]
+        return {
+            allergen for bit, allergen in enumerate(self.allergens)
+            if bits >> bit & 1
+        }
+
+    def flag_orders(self, batch, *allergens):
+        """Return array of 1s for orders containing any given allergen."""
+        mask = 0
+        for allergen in allergens:
+            mask |= 1 << self.allergens.index(allergen)
+        bits = self._allergen_bits
+        return array('B', [
+            bool(bits[index] & mask)
+            for index in map(self._combination, batch)
+        ])
+
+
+class FlavorCatalog:
+    """Collection of flavors with an inverted index of their ingredients.
+
+    Each flavor gets a slot number, and each ingredient maps to an int
+    bitmap of the slots of flavors containing it (as does has_dairy), so
+    inclusion and exclusion queries are bitwise ANDs.  Flavors update
+    the index themselves when their ingredients change.
+    """
+
+    def __init__(self, flavors=()):
+        self._flavors = []
+        self._slots = {}
+        self._free_slots = []
+        self._indexed = []
+        self._postings = {}
+        self._all = 0
+        self._dairy = 0
+        for flavor in flavors:
+            self.add(flavor)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __iter__(self):
+        return iter(self._slots)
+
+    def __contains__(self, flavor):
+        return flavor in self._slots
+
+    def add(self, flavor):
+        """Add flavor to the catalog and index its ingredients."""
+        if flavor in self._slots:
+            raise ValueError(f"{flavor!r} is already in the catalog")
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._flavors[slot] = flavor
+            self._indexed[slot] = frozenset()
+        else:
+            slot = len(self._flavors)
+            self._flavors.append(flavor)
+            self._indexed.append(frozenset())
+        self._slots[flavor] = slot
+        self._all |= 1 << slot
+        flavor._catalogs.add(self)
+        self._reindex(flavor)
+
+    def remove(self, flavor):
+        """Remove flavor from the catalog and its index."""
+        slot = self._slots.pop(flavor)
+        flavor._catalogs.discard(self)
+        self._update_postings(slot, frozenset(), has_dairy=False)
+        self._all &= ~(1 << slot)
+        self._flavors[slot] = None
+        self._free_slots.append(slot)
+
+    def _reindex(self, flavor):
+        self._update_postings(
+            self._slots[flavor],
+            frozenset(flavor.ingredients),
+            flavor.has_dairy,
+        )
+
+    def _update_postings(self, slot, ingredients, has_dairy):
+        bit = 1 << slot
+        postings = self._postings
+        for ingredient in self._indexed[slot] - ingredients:
+            posting = postings[ingredient] & ~bit
+            if posting:
+                postings[ingredient] = posting
+            else:
+                del postings[ingredient]
+        for ingredient in ingredients - self._indexed[slot]:
+            postings[ingredient] = postings.get(ingredient, 0) | bit
+        self._indexed[slot] = ingredients
+        if has_dairy:
+            self._dairy |= bit
+        else:
+            self._dairy &= ~bit
+
+    def where(self, include=(), exclude=(), has_dairy=None):
+        """Return flavors with all of include, none of exclude, and has_dairy.
+
+        Flavors are returned in slot order (the order they were added in
+        unless removed flavors' slots have been reused).
+        """
+        bitmap = self._all
+        for ingredient in include:
+            bitmap &= self._postings.get(ingredient, 0)
+        for ingredient in exclude:
+            bitmap &= ~self._postings.get(ingredient, 0)
+        if has_dairy is not None:
+            bitmap &= self._dairy if has_dairy else ~self._dairy
+        return [self._flavors[slot] for slot in _bitmap_rows(bitmap)]
+
+
+def _iso_month_ordinal(month_string, allow_day=False):
+    """Return month ordinal for 'YYYY-MM' (or 'YYYY-MM-DD' if allow_day)."""
+    year, dash, month = month_string[:4], month_string[4:5], month_string[5:7]
+    day = month_string[7:]
+    if (dash == '-' and len(month) == 2 and year.isdigit() and month.isdigit()
+            and year.isascii() and month.isascii() and 1 <= int(month) <= 12
+            and (not day or allow_day and len(day) == 3 and day[0] == '-'
+                 and day[1:].isdigit() and day[1:].isascii()
+                 and 1 <= int(day[1:]) <= monthrange(int(year), int(month))[1])):
+        return int(year) * 12 + int(month) - 1
+    raise ValueError(f"Invalid isoformat string: {month_string!r}")
+
 
 class Month:
-    """Class representing an entire month."""
+    """Class representing an entire month.
+
+    A month is stored as a single ordinal, ``year * 12 + month - 1``, so
+    comparisons, hashing, and MonthDelta arithmetic are integer
+    operations.  Months from 1900 through 2099 are interned.  Formatted
+    strings are cached per time locale and format spec.
+    """
+
+    __slots__ = ('_ordinal',)
+
+    _INTERNED_RANGE = range(1900 * 12, 2100 * 12)
+    _interned = {}
+    _rendered = {}
+
+    def __new__(cls, year, month):
+        if not 1 <= month <= 12:
+            raise ValueError(f"month must be in 1..12, not {month!r}")
+        return cls._from_ordinal(year * 12 + month - 1)
+
+    @classmethod
+    def _from_ordinal(cls, ordinal):
+        if cls is Month and ordinal in cls._INTERNED_RANGE:
+            month = cls._interned.get(ordinal)
+            if month is None:
+                month = cls._interned[ordinal] = object.__new__(cls)
+                month._ordinal = ordinal
+            return month
+        month = object.__new__(cls)
+        month._ordinal = ordinal
+        return month
+
+    @classmethod
+    def from_date(cls, date):
+        """Return the month the given date is in."""
+        return cls._from_ordinal(date.year * 12 + date.month - 1)
+
+    @classmethod
+    def fromisoformat(cls, month_string):
+        """Return month from a 'YYYY-MM' string without making a date."""
+        return cls._from_ordinal(_iso_month_ordinal(month_string))
+
+    @property
+    def year(self):
+        return self._ordinal // 12
+
+    @property
+    def month(self):
+        return self._ordinal % 12 + 1
+
+    def first(self):
+        """Return date of the first day of this month."""
+        return date(self._ordinal // 12, self._ordinal % 12 + 1, 1)
+
+    def __reduce__(self):
+        return (type(self), (self.year, self.month))
+
+    def __repr__(self):
+        return f"{type(self).__name__}(year={self.year}, month={self.month})"
+
+    def __str__(self):
+        return f"{self._ordinal // 12:04d}-{self._ordinal % 12 + 1:02d}"
+
+    def __format__(self, format_spec):
+        if not format_spec:
+            return str(self)
+        key = (setlocale(LC_TIME), format_spec)
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            rendered = self._rendered[key] = {}
+        text = rendered.get(self._ordinal)
+        if text is None:
+            text = rendered[self._ordinal] = self.first().strftime(format_spec)
+        return text
+
+    def __hash__(self):
+        return hash(self._ordinal)
+
+    def __eq__(self, other):
+        if not isinstance(other, Month):
+            return NotImplemented
+        return self._ordinal == other._ordinal
+
+    def __lt__(self, other):
+        if not isinstance(other, Month):
+            return NotImplemented
+        return self._ordinal < other._ordinal
+
+    def __le__(self, other):
+        if not isinstance(other, Month):
+            return NotImplemented
+        return self._ordinal <= other._ordinal
+
+    def __gt__(self, other):
+        if not isinstance(other, Month):
+            return NotImplemented
+        return self._ordinal > other._ordinal
+
+    def __ge__(self, other):
+        if not isinstance(other, Month):
+            return NotImplemented
+        return self._ordinal >= other._ordinal
+
+    def __add__(self, other):
+        if not isinstance(other, MonthDelta):
+            return NotImplemented
+        return type(self)._from_ordinal(self._ordinal + other.months)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, MonthDelta):
+            return type(self)._from_ordinal(self._ordinal - other.months)
+        if isinstance(other, Month):
+            return MonthDelta(self._ordinal - other._ordinal)
+        return NotImplemented
 
 
 class MonthDelta:
     """Class representing the difference between months."""
 
+    __slots__ = ('months',)
+
+    def __init__(self, months):
+        self.months = months
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.months!r})"
+
+    def __hash__(self):
+        return hash((MonthDelta, self.months))
+
+    def __eq__(self, other):
+        if not isinstance(other, MonthDelta):
+            return NotImplemented
+        return self.months == other.months
+
+    def __add__(self, other):
+        if not isinstance(other, MonthDelta):
+            return NotImplemented
+        return MonthDelta(self.months + other.months)
+
+    def __sub__(self, other):
+        if not isinstance(other, MonthDelta):
+            return NotImplemented
+        return MonthDelta(self.months - other.months)
+
+    def __mul__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        return MonthDelta(self.months * other)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if not isinstance(other, MonthDelta):
+            return NotImplemented
+        return self.months / other.months
+
+    def __floordiv__(self, other):
+        if isinstance(other, MonthDelta):
+            return self.months // other.months
+        if isinstance(other, int):
+            return MonthDelta(self.months // other)
+        return NotImplemented
+
+    def __mod__(self, other):
+        if isinstance(other, MonthDelta):
+            return self.months % other.months
+        if isinstance(other, int):
+            return MonthDelta(self.months % other)
+        return NotImplemented
+
+    def __neg__(self):
+        return MonthDelta(-self.months)
+
+
+class MonthArray(Sequence):
+    """Sequence of months stored as 32-bit month ordinals.
+
+    Arithmetic with MonthDelta, comparisons, and counting work on the
+    ordinal array directly; Month objects are only made when indexing.
+    Ordering comparisons (and the equal and not_equal methods) are
+    elementwise and return arrays of 0s and 1s; == and != compare whole
+    MonthArrays and return a bool.
+    """
+
+    __hash__ = None
+
+    def __init__(self, months=()):
+        self._ordinals = array('i', map(attrgetter('_ordinal'), months))
+
+    @classmethod
+    def _from_ordinals(cls, ordinals):
+        months = cls.__new__(cls)
+        months._ordinals = array('i', ordinals)
+        return months
+
+    @classmethod
+    def from_dates(cls, dates):
+        """Return MonthArray for dates, ISO date strings, or datetime64s.
+
+        ISO strings ('2019-05' or '2019-05-17') are parsed and validated
+        without making dates; invalid ones raise ValueError.
+        NumPy datetime64 arrays are converted with astype.
+        """
+        if hasattr(dates, 'astype'):
+            months = dates.astype('datetime64[M]').astype('int64') + 1970 * 12
+            return cls._from_ordinals(months.tolist())
+        dates = list(dates)
+        if dates and isinstance(dates[0], str):
+            return cls._from_ordinals([
+                _iso_month_ordinal(text, allow_day=True)
+                for text in dates
+            ])
+        return cls._from_ordinals([d.year * 12 + d.month - 1 for d in dates])
+
+    def __len__(self):
+        return len(self._ordinals)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._from_ordinals(self._ordinals[index])
+        return Month._from_ordinal(self._ordinals[index])
+
+    def __repr__(self):
+        return f"{type(self).__name__}({list(self)!r})"
+
+    def first(self):
+        """Return list of the first date of each month."""
+        return [
+            date(ordinal // 12, ordinal % 12 + 1, 1)
+            for ordinal in self._ordinals
+        ]
+
+    def value_counts(self):
+        """Return dict mapping each month to its count, in month order."""
+        counts = Counter(self._ordinals)
+        return {
+            Month._from_ordinal(ordinal): counts[ordinal]
+            for ordinal in sorted(counts)
+        }
+
+    def __add__(self, other):
+        if not isinstance(other, MonthDelta):
+            return NotImplemented
+        return self._from_ordinals(map(partial(add, other.months), self._ordinals))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if not isinstance(other, MonthDelta):
+            return NotImplemented
+        return self._from_ordinals(map(partial(add, -other.months), self._ordinals))
+
+    def _compare(self, other, operator_name):
+        if isinstance(other, Month):
+            return array('B', map(
+                getattr(other._ordinal, operator_name),
+                self._ordinals,
+            ))
+        if isinstance(other, MonthArray):
+            if len(other) != len(self):
+                raise ValueError("MonthArrays differ in length")
+            return array('B', map(
+                getattr(int, operator_name),
+                other._ordinals,
+                self._ordinals,
+            ))
+        return NotImplemented
+
+    def __eq__(self, other):
+        if not isinstance(other, MonthArray):
+            return NotImplemented
+        return self._ordinals == other._ordinals
+
+    def equal(self, other):
+        """Return array of 1s where months equal other's (or a Month)."""
+        mask = self._compare(other, '__eq__')
+        if mask is NotImplemented:
+            raise TypeError(f"Can't compare MonthArray to {other!r}")
+        return mask
+
+    def not_equal(self, other):
+        """Return array of 1s where months differ from other's (or a Month)."""
+        mask = self._compare(other, '__ne__')
+        if mask is NotImplemented:
+            raise TypeError(f"Can't compare MonthArray to {other!r}")
+        return mask
+
+    # Comparisons are reflected: a < month is month.__gt__(a)
+
+    def __lt__(self, other):
+        return self._compare(other, '__gt__')
+
+    def __le__(self, other):
+        return self._compare(other, '__ge__')
+
+    def __gt__(self, other):
+        return self._compare(other, '__lt__')
+
+    def __ge__(self, other):
+        return self._compare(other, '__le__')
+
+
+class MonthRange(Sequence):
+    """Lazy range of months, like range but over Month and MonthDelta.
+
+    Only the start, stop, and step ordinals are stored (in a range), so
+    len, indexing, slicing, and membership tests are all O(1).
+    """
+
+    def __init__(self, start, stop, step=MonthDelta(1)):
+        self._range = range(start._ordinal, stop._ordinal, step.months)
+
+    @classmethod
+    def _from_range(cls, ordinals):
+        months = cls.__new__(cls)
+        months._range = ordinals
+        return months
+
+    @property
+    def start(self):
+        return Month._from_ordinal(self._range.start)
+
+    @property
+    def stop(self):
+        return Month._from_ordinal(self._range.stop)
+
+    @property
+    def step(self):
+        return MonthDelta(self._range.step)
+
+    def __len__(self):
+        return len(self._range)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._from_range(self._range[index])
+        return Month._from_ordinal(self._range[index])
+
+    def __iter__(self):
+        return map(Month._from_ordinal, self._range)
+
+    def __reversed__(self):
+        return map(Month._from_ordinal, reversed(self._range))
+
+    def __contains__(self, month):
+        return isinstance(month, Month) and month._ordinal in self._range
+
+    def index(self, month):
+        if month not in self:
+            raise ValueError(f"{month!r} is not in range")
+        return self._range.index(month._ordinal)
+
+    def count(self, month):
+        return int(month in self)
+
+    def __eq__(self, other):
+        if not isinstance(other, MonthRange):
+            return NotImplemented
+        return self._range == other._range
+
+    def __hash__(self):
+        return hash(self._range)
+
+    def __repr__(self):
+        name = type(self).__name__
+        return f"{name}({self.start!r}, {self.stop!r}, {self.step!r})"
+
+
+def _row_from_values(fields, values):
+    return Row.schema(*fields)(*values)
+
 
 class Row:
-    """Row class that stores all given arguments as attributes."""
+    """Row class that stores all given arguments as attributes.
+
+    Rows are instances of a generated ``__slots__`` subclass per field
+    tuple, so no row has a ``__dict__``.  Keyword arguments are sorted
+    by name, so rows with the same keys share one class whatever order
+    they were given in.  Row.schema returns the class for an explicit
+    field order, which also accepts its fields positionally.  Rows are
+    equal when they have the same fields with the same values, and rows
+    with hashable values are hashable (don't change a row's attributes
+    while it's in a set or used as a dict key).
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _schemas = {}
+
+    def __new__(cls, *args, **kwargs):
+        if cls is Row:
+            if args:
+                raise TypeError("Row only accepts keyword arguments")
+            cls = cls.schema(*sorted(kwargs))
+        return object.__new__(cls)
+
+    @classmethod
+    def schema(cls, *fields):
+        """Return the (cached) Row class with the given fields."""
+        row_class = Row._schemas.get(fields)
+        if row_class is None:
+            row_class = Row._schemas[fields] = Row._make_schema(fields)
+        return row_class
+
+    @staticmethod
+    def _make_schema(fields):
+        for name in fields:
+            if (not isinstance(name, str) or not name.isidentifier()
+                    or iskeyword(name) or name.startswith('_')):
+                raise ValueError(f"Invalid field name: {name!r}")
+        if len(set(fields)) != len(fields):
+            raise ValueError(f"Duplicate field names: {fields!r}")
+        # Generated like namedtuple's __new__: plain attribute assignments
+        # are much faster than looping over setattr for every row.
+        assignments = "".join(f"\n    self.{name} = {name}" for name in fields)
+        namespace = {}
+        exec(
+            f"def __init__(self, {', '.join(fields)}):{assignments or ' pass'}",
+            namespace,
+        )
+        return type('Row', (Row,), {
+            '__slots__': fields,
+            '__module__': Row.__module__,
+            '__qualname__': 'Row',
+            '__init__': namespace['__init__'],
+            '_fields': fields,
+        })
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def _asdict(self):
+        """Return a dict mapping field names to values."""
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __eq__(self, other):
+        if not isinstance(other, Row):
+            return NotImplemented
+        if self._fields == other._fields:
+            return self._values() == other._values()
+        return self._asdict() == other._asdict()
+
+    def __hash__(self):
+        # Field names are unique, so sorting never compares values
+        return hash(tuple(sorted(zip(self._fields, self._values()))))
+
+    def __reduce__(self):
+        return (_row_from_values, (self._fields, self._values()))
+
+    def __dir__(self):
+        return [
+            name for name in super().__dir__()
+            if name.startswith('__') or name in self._fields
+        ]
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v!r}" for k, v in self._asdict().items())
+        return f"Row({fields})"
+
+
+def _typed_column(values):
+    """Return values as an int or float array if possible, else a list."""
+    types = set(map(type, values))
+    if types <= {int}:
+        try:
+            return array('q', values)
+        except OverflowError:
+            return list(values)
+    if types <= {int, float}:
+        return array('d', values)
+    return list(values)
+
+
+def _extend_column(column, values):
+    """Extend column with values, widening its type if needed."""
+    chunk = _typed_column(values)
+    if isinstance(column, list) or isinstance(chunk, list):
+        if not isinstance(column, list):
+            column = column.tolist()
+        column.extend(chunk)
+    elif column.typecode == chunk.typecode:
+        column.extend(chunk)
+    elif column.typecode == 'q':
+        column = array('d', column)
+        column.extend(chunk)
+    else:
+        column.extend(array('d', chunk))
+    return column
+
+
+def _parse_csv_column(values):
+    """Return values as ints or floats, or None if they aren't numbers."""
+    for convert in (int, float):
+        try:
+            return list(map(convert, values))
+        except ValueError:
+            pass
+    return None
+
+
+def _read_csv_columns(path, indexes, count):
+    """Return the text of the given columns in the first count CSV rows."""
+    with open(path, newline='') as csv_file:
+        rows = filter(None, csv.reader(csv_file))
+        next(rows, None)
+        columns = [[] for _ in indexes]
+        for row in islice(rows, count):
+            for column, i in zip(columns, indexes):
+                column.append(row[i])
+    return columns
+
+
+class _RowView(Row):
+    """Read-only Row whose fields are read from a RowTable's columns."""
+
+    __slots__ = ('_columns', '_index')
+
+
+class RowTable:
+    """Table of rows stored column-wise.
+
+    Columns of ints or floats are stored as typed arrays (widened from
+    int to float, or to a list of objects, when other values arrive).
+    Indexing returns read-only Row views onto the columns, and filter,
+    project, and group_by work on whole columns rather than on rows.
+    """
+
+    def __init__(self, fields, rows=(), chunk_size=10_000):
+        self.fields = tuple(fields)
+        self._columns = [array('q') for _ in self.fields]
+        self._length = 0
+        self._view_class = self._make_view_class(self.fields)
+        self.extend(rows, chunk_size)
+
+    @staticmethod
+    def _make_view_class(fields):
+        Row.schema(*fields)  # Validates the field names
+        namespace = {'__slots__': (), '_fields': fields, '__qualname__': 'Row'}
+        for i, name in enumerate(fields):
+            namespace[name] = property(
+                lambda view, i=i: view._columns[i][view._index]
+            )
+        return type('Row', (_RowView,), namespace)
+
+    @classmethod
+    def _from_columns(cls, fields, columns):
+        table = cls.__new__(cls)
+        table.fields = fields
+        table._columns = columns
+        table._length = len(columns[0]) if columns else 0
+        table._view_class = cls._make_view_class(fields)
+        return table
+
+    def _extend_chunks(self, chunks):
+        for chunk in chunks:
+            for i, values in enumerate(chunk):
+                self._columns[i] = _extend_column(self._columns[i], values)
+            if chunk:
+                self._length += len(chunk[0])
+
+    @staticmethod
+    def _chunked(records, chunk_size):
+        """Yield lists of at most chunk_size records from records."""
+        records = iter(records)
+        while chunk := list(islice(records, chunk_size)):
+            yield chunk
+
+    def extend(self, rows, chunk_size=10_000):
+        """Append Rows (or other objects with the table's attributes)."""
+        self._extend_chunks(
+            [[getattr(row, name) for row in chunk] for name in self.fields]
+            for chunk in self._chunked(rows, chunk_size)
+        )
+
+    @classmethod
+    def from_csv(cls, path, chunk_size=10_000):
+        """Return table read from a CSV file with a header row.
+
+        The file is streamed chunk_size rows at a time.  Columns are
+        parsed as ints, or else floats; once any value in a column isn't
+        a number the whole column is kept as strings (the text of values
+        parsed from earlier chunks is read from the file again).  Blank
+        lines are skipped and rows with the wrong number of fields are an
+        error.
+        """
+        with open(path, newline='') as csv_file:
+            reader = csv.reader(csv_file)
+            table = cls(next(reader, ()))
+            width = len(table.fields)
+
+            def rows():
+                for row in reader:
+                    if not row:
+                        continue
+                    if len(row) != width:
+                        raise ValueError(
+                            f"Line {reader.line_num} has {len(row)} fields, "
+                            f"expected {width}"
+                        )
+                    yield row
+
+            string_columns = set()
+            for chunk in cls._chunked(rows(), chunk_size):
+                columns, found = [], []
+                for i, values in enumerate(zip(*chunk)):
+                    values = list(values)
+                    if i not in string_columns:
+                        numbers = _parse_csv_column(values)
+                        if numbers is None:
+                            found.append(i)
+                        else:
+                            values = numbers
+                    columns.append(values)
+                if found:
+                    texts = _read_csv_columns(path, found, len(table))
+                    for i, text in zip(found, texts):
+                        table._columns[i] = text
+                    string_columns.update(found)
+                table._extend_chunks([columns])
+        return table
+
+    @classmethod
+    def from_jsonl(cls, path, chunk_size=10_000):
+        """Return table read from a file with one JSON object per line.
+
+        Fields are the keys of the first object; missing keys are None.
+        The file is streamed chunk_size lines at a time.
+        """
+        with open(path) as jsonl_file:
+            records = map(json.loads, filter(str.strip, jsonl_file))
+            first = next(records, None)
+            if first is None:
+                return cls(())
+            table = cls(first)
+            table._extend_chunks(
+                [[record.get(name) for record in chunk] for name in table.fields]
+                for chunk in cls._chunked(chain([first], records), chunk_size)
+            )
+        return table
+
+    def column(self, name):
+        """Return the array (or list) of values for the given field."""
+        return self._columns[self.fields.index(name)]
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._from_columns(
+                self.fields,
+                [column[index] for column in self._columns],
+            )
+        index = range(self._length)[index]
+        view = object.__new__(self._view_class)
+        view._columns = self._columns
+        view._index = index
+        return view
+
+    def __iter__(self):
+        return map(self.__getitem__, range(self._length))
+
+    def __repr__(self):
+        return f"{type(self).__name__}(fields={self.fields!r}, rows={len(self)})"
+
+    def _take(self, indexes, fields=None):
+        """Return table of the given row indexes (and fields)."""
+        if fields is None:
+            fields = self.fields
+        columns = []
+        for name in fields:
+            column = self.column(name)
+            values = map(column.__getitem__, indexes)
+            if isinstance(column, list):
+                columns.append(list(values))
+            else:
+                columns.append(array(column.typecode, values))
+        return self._from_columns(fields, columns)
+
+    def filter(self, **predicates):
+        """Return table of rows where predicate(value) is true for each field.
+
+        Each keyword maps a field name to a function which is called
+        with every value in that column.
+        """
+        selected = range(self._length)
+        for name, predicate in predicates.items():
+            column = self.column(name)
+            selected = list(compress(
+                selected,
+                map(predicate, map(column.__getitem__, selected)),
+            ))
+        return self._take(selected)
+
+    def project(self, *fields):
+        """Return table with only the given fields (copied columns)."""
+        return self._from_columns(
+            fields,
+            [copy(self.column(name)) for name in fields],
+        )
+
+    def group_by(self, *fields):
+        """Return dict mapping field values to tables of matching rows.
+
+        Keys are single values when grouping by one field and tuples of
+        values when grouping by several, in first-seen order.
+        """
+        if len(fields) == 1:
+            keys = self.column(fields[0])
+        else:
+            keys = zip(*map(self.column, fields))
+        groups = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(key, array('L')).append(i)
+        return {key: self._take(rows) for key, rows in groups.items()}
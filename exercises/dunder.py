@@ -1,12 +1,288 @@
 """Dunder exercises"""
+from array import array
+from collections.abc import Sequence
+from itertools import chain, repeat
+from numbers import Number
+from operator import add, le, not_, sub
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-class ReverseView:
-    """Lazily operate on a sequence in reverse."""
+
+class SliceView(Sequence):
+    """Lazily operate on sequence[start:stop:step] without copying it.
+
+    Views of views are flattened: each view keeps the innermost sequence
+    and the chain of slices applied to it, and resolves that chain into
+    a single (start, step, length) mapping whenever the underlying
+    sequence's length changes.  Indexing a view is then one multiply and
+    add, and slicing a view returns another view.
+    """
+
+    __slots__ = ('_sequence', '_slices', '_mapping')
+
+    def __init__(self, sequence, start=None, stop=None, step=None):
+        self._compose(sequence, slice(start, stop, step))
+
+    def _compose(self, sequence, view_slice):
+        if isinstance(sequence, SliceView):
+            self._sequence = sequence._sequence
+            self._slices = (*sequence._slices, view_slice)
+        else:
+            self._sequence = sequence
+            self._slices = (view_slice,)
+        self._mapping = (None, 0, 1, 0)
+
+    def _affine(self):
+        """Return (start, step, length) for the current sequence length."""
+        sequence_length = len(self._sequence)
+        mapping = self._mapping
+        if mapping[0] != sequence_length:
+            indices = range(sequence_length)
+            for view_slice in self._slices:
+                indices = indices[view_slice]
+            mapping = (sequence_length, indices.start, indices.step, len(indices))
+            self._mapping = mapping
+        return mapping[1:]
+
+    def __len__(self):
+        return self._affine()[2]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SliceView(self, index.start, index.stop, index.step)
+        start, step, length = self._affine()
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError(f"{type(self).__name__} index out of range")
+        return self._sequence[start + index * step]
+
+    def __iter__(self):
+        start, step, length = self._affine()
+        indices = range(start, start + length * step, step)
+        return map(self._sequence.__getitem__, indices)
+
+    def __reversed__(self):
+        start, step, length = self._affine()
+        indices = range(start + (length - 1) * step, start - step, -step)
+        return map(self._sequence.__getitem__, indices)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class StrideView(SliceView):
+    """Lazily operate on every step-th item of sequence, from start."""
+
+    __slots__ = ()
+
+    def __init__(self, sequence, step, start=None):
+        self._compose(sequence, slice(start, None, step))
+
+
+class ReverseView(SliceView):
+    """Lazily operate on a sequence in reverse.
+
+    For bytes-like objects (memoryviews, arrays, mmaps, and anything else
+    supporting the buffer protocol) the chunks and records class methods
+    scan the buffer backwards a chunk at a time instead of an item at a
+    time.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, sequence):
+        self._compose(sequence, slice(None, None, -1))
+
+    @staticmethod
+    def chunks(buffer, chunk_size=1 << 16):
+        """Yield reversed memoryviews of up to chunk_size items, last first.
+
+        The memoryviews share the buffer's memory and keep its item
+        format, so chunk.tolist() decodes a whole chunk at once.
+        """
+        with memoryview(buffer) as data:
+            for end in range(len(data), 0, -chunk_size):
+                yield data[max(end - chunk_size, 0):end][::-1]
+
+    @staticmethod
+    def records(buffer, separator=b'\n', chunk_size=1 << 20):
+        """Yield separator-delimited records from buffer as bytes, last first.
+
+        Records don't include the separator, and a trailing separator
+        doesn't start an empty record (like the lines of a file).  The
+        buffer is copied and split chunk_size bytes at a time, so memory
+        use doesn't depend on the size of the buffer.
+
+        Separators which can overlap themselves (like b'||' or b'\n\n')
+        are rejected: where they fall depends on everything before them,
+        which a backwards scan hasn't read yet.
+        """
+        if any(
+            separator[:size] == separator[-size:]
+            for size in range(1, len(separator))
+        ):
+            raise ValueError(f"Separator {separator!r} can overlap itself")
+        with memoryview(buffer) as view, view.cast('B') as data:
+            end = len(data)
+            if not end:
+                return
+            if data[max(end - len(separator), 0):] == separator:
+                end -= len(separator)
+            tail = b''
+            while end:
+                start = max(end - chunk_size, 0)
+                records = (data[start:end].tobytes() + tail).split(separator)
+                tail = records.pop(0)
+                yield from reversed(records)
+                end = start
+            yield tail
+
+
+class ConcatView(Sequence):
+    """Lazily operate on several sequences as if they were one.
+
+    Nested ConcatViews are flattened.  Indexing finds the right sequence
+    by walking their (current) lengths, so it's O(number of sequences).
+    """
+
+    __slots__ = ('_sequences',)
+
+    def __init__(self, *sequences):
+        self._sequences = tuple(chain.from_iterable(
+            sequence._sequences if isinstance(sequence, ConcatView)
+            else (sequence,)
+            for sequence in sequences
+        ))
+
+    def __len__(self):
+        return sum(map(len, self._sequences))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SliceView(self, index.start, index.stop, index.step)
+        if index < 0:
+            index += len(self)
+        if index >= 0:
+            for sequence in self._sequences:
+                length = len(sequence)
+                if index < length:
+                    return sequence[index]
+                index -= length
+        raise IndexError(f"{type(self).__name__} index out of range")
+
+    def __iter__(self):
+        return chain.from_iterable(self._sequences)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def _uses_numpy(*operands):
+    return numpy is not None and any(
+        isinstance(operand, numpy.ndarray) for operand in operands
+    )
+
+
+def _is_array(operand):
+    return isinstance(operand, array) or _uses_numpy(operand)
+
+
+def _broadcast(*operands):
+    """Return arrays as-is and other operands repeated, for map."""
+    lengths = {len(x) for x in operands if isinstance(x, array)}
+    if len(lengths) > 1:
+        raise ValueError("Arrays differ in length")
+    return [x if isinstance(x, array) else repeat(x) for x in operands]
+
+
+def _elementwise(function, x, y, numpy_function=None):
+    """Return function(x, y), applied item by item if either is an array."""
+    if _uses_numpy(x, y):
+        return (numpy_function or function)(x, y)
+    if isinstance(x, array) or isinstance(y, array):
+        return array('d', map(function, *_broadcast(x, y)))
+    return function(x, y)
 
 
 class Comparator:
-    """Object that is equal to a very small range of numbers."""
+    """Object that is equal to a very small range of numbers.
+
+    The value and delta can also be arrays (see batch), and comparing
+    with an array.array or NumPy array gives an array of 1s and 0s (or a
+    NumPy boolean array) instead of a single bool.  array.array
+    operations are chains of map calls, so no Python code runs per item.
+    """
+
+    # Make NumPy return NotImplemented for ndarray == comparator so our
+    # reflected __eq__ runs once instead of once per item.
+    __array_ufunc__ = None
+
+    def __init__(self, value, delta=1e-7):
+        self.value = value
+        self.delta = delta
+
+    @classmethod
+    def batch(cls, values, deltas=1e-7):
+        """Return Comparator for many values, each with its own delta.
+
+        deltas can be a single number or one number per value.  Values
+        and deltas which aren't already arrays become float arrays.
+        """
+        if not _is_array(values):
+            values = array('d', values)
+        if not isinstance(deltas, Number) and not _is_array(deltas):
+            deltas = array('d', deltas)
+        return cls(values, deltas)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.value!r}, delta={self.delta!r})"
+
+    def __eq__(self, other):
+        operands = (other, self.value, self.delta)
+        if _uses_numpy(*operands) or not any(map(_is_array, operands)):
+            try:
+                return abs(other - self.value) <= self.delta
+            except TypeError:
+                return NotImplemented
+        others, values, deltas = _broadcast(*operands)
+        return array('B', map(le, map(abs, map(sub, others, values)), deltas))
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        if isinstance(equal, array):
+            return array('B', map(not_, equal))
+        return ~equal if _uses_numpy(equal) else not equal
+
+    def _delta_with(self, other):
+        maximum = numpy.maximum if numpy is not None else None
+        return _elementwise(max, self.delta, other.delta, maximum)
+
+    def __add__(self, other):
+        if isinstance(other, Comparator):
+            return Comparator(
+                _elementwise(add, self.value, other.value),
+                self._delta_with(other),
+            )
+        return Comparator(_elementwise(add, self.value, other), self.delta)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Comparator):
+            return Comparator(
+                _elementwise(sub, self.value, other.value),
+                self._delta_with(other),
+            )
+        return Comparator(_elementwise(sub, self.value, other), self.delta)
+
+    def __rsub__(self, other):
+        return Comparator(_elementwise(sub, other, self.value), self.delta)
 
 
 class RomanNumeral:
@@ -1,14 +1,26 @@
 """Tests for dunder exercises"""
+from array import array
 from collections.abc import Generator, Iterable, Mapping
 from io import StringIO
+from mmap import ACCESS_READ, mmap
+from pathlib import Path
+from tempfile import TemporaryDirectory
 from textwrap import dedent
 from time import sleep
 from sys import getsizeof
+from timeit import default_timer
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from dunder import (
     ReverseView,
+    SliceView,
+    StrideView,
+    ConcatView,
     Comparator,
     RomanNumeral,
     Timer,
@@ -95,6 +107,124 @@ class ReverseViewTests(unittest.TestCase):
         self.assertEqual(list(view), [29, 18, 11, 7, 4, 3, 1])
         self.assertEqual(str(view), "[29, 18, 11, 7, 4, 3, 1]")
 
+    def test_reverse_chunks_of_buffers(self):
+        numbers = array('i', range(10))
+        chunks = list(ReverseView.chunks(numbers, chunk_size=4))
+        self.assertEqual([chunk.tolist() for chunk in chunks], [
+            [9, 8, 7, 6], [5, 4, 3, 2], [1, 0],
+        ])
+        numbers[9] = 90
+        self.assertEqual(chunks[0][0], 90)
+        self.assertEqual(list(ReverseView.chunks(b'')), [])
+
+    def test_reverse_records(self):
+        for text in [b'', b'\n', b'a', b'a\nbb\n', b'a\n\nbb\n\n', b'one\ntwo']:
+            expected = text.splitlines()[::-1]
+            for chunk_size in (1, 2, 3, 1 << 20):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    records = ReverseView.records(text, chunk_size=chunk_size)
+                    self.assertEqual(list(records), expected)
+        text = b'ab|;c|;|;d|;'
+        for chunk_size in range(1, len(text) + 1):
+            with self.subTest(text=text, chunk_size=chunk_size):
+                records = ReverseView.records(text, b'|;', chunk_size)
+                self.assertEqual(list(records), [b'd', b'', b'c', b'ab'])
+        for separator in (b'||', b'\n\n', b'abca'):
+            with self.subTest(separator=separator):
+                with self.assertRaises(ValueError):
+                    list(ReverseView.records(b'ab||c||||d', separator))
+
+    def test_reverse_records_of_mmap(self):
+        with TemporaryDirectory() as directory:
+            path = Path(directory, 'app.log')
+            path.write_bytes(b''.join(
+                b'%d: event\n' % n for n in range(10_000)
+            ))
+            with open(path, 'rb') as log, mmap(log.fileno(), 0, access=ACCESS_READ) as data:
+                records = ReverseView.records(data, chunk_size=4096)
+                self.assertEqual(next(records), b'9999: event')
+                self.assertEqual(next(records), b'9998: event')
+                self.assertEqual(sum(1 for _ in records), 9998)
+
+    def test_reverse_records_throughput(self):
+        data = b''.join(b'%d: some log text\n' % n for n in range(200_000))
+        start = default_timer()
+        for _ in reversed(data.split(b'\n')):
+            pass
+        split_time = default_timer() - start
+        start = default_timer()
+        for _ in ReverseView.records(data):
+            pass
+        records_time = default_timer() - start
+        self.assertLess(records_time, split_time * 3)
+
+
+class SequenceViewTests(unittest.TestCase):
+
+    """Tests for SliceView, StrideView, and ConcatView."""
+
+    def test_slice_view(self):
+        numbers = list(range(10))
+        view = SliceView(numbers, 2, -2)
+        self.assertEqual(list(view), [2, 3, 4, 5, 6, 7])
+        self.assertEqual((len(view), view[0], view[-1]), (6, 2, 7))
+        with self.assertRaises(IndexError):
+            view[6]
+        numbers.append(10)
+        self.assertEqual(list(view), [2, 3, 4, 5, 6, 7, 8])
+        self.assertEqual(list(SliceView(numbers, step=-3)), numbers[::-3])
+        self.assertEqual(list(SliceView(numbers, 5, 1)), [])
+        self.assertIn(4, view)
+        self.assertEqual(view.index(4), 2)
+
+    def test_stride_view(self):
+        numbers = list(range(10))
+        self.assertEqual(list(StrideView(numbers, 3)), [0, 3, 6, 9])
+        self.assertEqual(list(StrideView(numbers, 3, start=1)), [1, 4, 7])
+        self.assertEqual(list(StrideView(numbers, -4)), [9, 5, 1])
+        self.assertEqual(StrideView(numbers, 2)[-1], 8)
+
+    def test_concat_view(self):
+        first, second = [1, 2], [3, 4, 5]
+        view = ConcatView(first, (), ConcatView(second, "ab"))
+        self.assertEqual(list(view), [1, 2, 3, 4, 5, "a", "b"])
+        self.assertEqual(len(view), 7)
+        self.assertEqual((view[2], view[-1], view[-7]), (3, "b", 1))
+        with self.assertRaises(IndexError):
+            view[7]
+        with self.assertRaises(IndexError):
+            view[-8]
+        second.append(6)
+        self.assertEqual(view[5], 6)
+        self.assertEqual(list(view[1:4]), [2, 3, 4])
+        self.assertEqual(str(ReverseView(view)), "['b', 'a', 6, 5, 4, 3, 2, 1]")
+
+    def test_nested_views_collapse_to_one_mapping(self):
+        numbers = list(range(100))
+        view = ReverseView(StrideView(SliceView(numbers, 10, 90), 3)[2:-2])
+        expected = numbers[10:90][::3][2:-2][::-1]
+        self.assertEqual(list(view), expected)
+        self.assertEqual(list(reversed(view)), expected[::-1])
+        self.assertEqual(
+            [view[i] for i in range(-len(view), len(view))],
+            expected + expected,
+        )
+        self.assertEqual(list(view[::4]), expected[::4])
+        self.assertIs(view._sequence, numbers)
+        numbers.extend(range(100, 110))
+        self.assertEqual(list(view), numbers[10:90][::3][2:-2][::-1])
+
+    def test_views_do_not_copy_huge_sequences(self):
+        data = memoryview(bytearray(range(256)) * 40_000)
+        view = StrideView(ReverseView(SliceView(data, 1000)), 7)[10:]
+        expected = data[1000:][::-1][::7][10:]
+        self.assertEqual(len(view), len(expected))
+        self.assertEqual((view[0], view[-1], view[12345]), (
+            expected[0], expected[-1], expected[12345],
+        ))
+        self.assertLess(getsizeof(view), 100)
+        self.assertEqual(sum(view), sum(expected))
+
 
 class ComparatorTests(unittest.TestCase):
 
@@ -154,6 +284,55 @@ class ComparatorTests(unittest.TestCase):
         self.assertEqual(seven + five, 12.5)
         self.assertNotEqual(five + seven, 12.6)
 
+    def test_comparisons_with_arrays_give_masks(self):
+        measured = array('d', [4.95, 5.2, 5.0, -5.0])
+        self.assertEqual(Comparator(5, delta=0.1) == measured, array('B', [1, 0, 1, 0]))
+        self.assertEqual(measured == Comparator(5, delta=0.1), array('B', [1, 0, 1, 0]))
+        self.assertEqual(measured != Comparator(5, delta=0.1), array('B', [0, 1, 0, 1]))
+        self.assertEqual(Comparator(5) == array('i', [5, 6]), array('B', [1, 0]))
+        shifted = 1 + Comparator(4, delta=0.1) - array('d', [0, -0.2, 0, 10])
+        self.assertEqual(shifted == measured, array('B', [1, 1, 1, 1]))
+
+    def test_batch(self):
+        expected = Comparator.batch([1, 2, 3], deltas=[0.1, 0.5, 0])
+        self.assertEqual(expected == array('d', [1.05, 2.6, 3]), array('B', [1, 0, 1]))
+        self.assertEqual(expected == 2.2, array('B', [0, 1, 0]))
+        wider = expected + Comparator(1, delta=0.3)
+        self.assertEqual(wider.delta, array('d', [0.3, 0.5, 0.3]))
+        self.assertEqual(wider == array('d', [2.25, 3.5, 3.65]), array('B', [1, 1, 0]))
+        self.assertEqual(
+            Comparator.batch([1, 2]) - array('d', [1, 1]) == 1,
+            array('B', [0, 1]),
+        )
+        with self.assertRaises(ValueError):
+            expected == array('d', [1, 2])
+
+    def test_batch_is_faster_than_scalar_loop(self):
+        count = 200_000
+        expected = array('d', (n / 7 for n in range(count)))
+        deltas = array('d', (0.001 * (n % 5) for n in range(count)))
+        measured = array('d', (x + 0.0025 for x in expected))
+        start = default_timer()
+        scalar = [
+            Comparator(value, delta=delta) == actual
+            for value, delta, actual in zip(expected, deltas, measured)
+        ]
+        scalar_time = default_timer() - start
+        start = default_timer()
+        mask = Comparator.batch(expected, deltas) == measured
+        batch_time = default_timer() - start
+        self.assertEqual(list(mask), scalar)
+        self.assertLess(batch_time, scalar_time / 2)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_numpy_arrays(self):
+        measured = numpy.array([4.95, 5.2, 5.0])
+        mask = measured == Comparator(5, delta=0.1)
+        self.assertEqual(mask.tolist(), [True, False, True])
+        batch = Comparator.batch(numpy.array([1.0, 2.0]), numpy.array([0.1, 0.5]))
+        self.assertEqual((batch == numpy.array([1.2, 2.4])).tolist(), [False, True])
+        self.assertEqual((batch != 2.0).tolist(), [True, False])
+
 
 class RomanNumeralTests(unittest.TestCase):
 
@@ -1,4 +1,10 @@
 """Inheritance exercises"""
+from array import array
+from collections import defaultdict
+from itertools import accumulate
+from operator import sub
+
+from classes import BankAccount
 
 
 class CyclicList:
@@ -9,9 +15,66 @@ class EasyDict:
     """Class which allows both attribute and get/set item syntax."""
 
 
-class MinimumBalanceAccount:
+class MinimumBalanceAccount(BankAccount):
     """Bank account which does not allow balance to drop below zero."""
 
+    def withdraw(self, amount):
+        with self._lock:
+            if self.balance - amount < 0:
+                raise ValueError("Balance cannot be less than $0")
+            super().withdraw(amount)
+
+    def post_batch(self, operations):
+        operations = list(operations)
+        running = accumulate(
+            amount if kind == 'DEPOSIT' else -amount
+            for kind, amount in operations
+        )
+        with self._lock:
+            if min(running, default=0) + self.balance < 0:
+                raise ValueError("Balance cannot be less than $0")
+            super().post_batch(operations)
+
+    def withdraw_many(self, amounts):
+        amounts = list(amounts)
+        with self._lock:
+            if min(accumulate(amounts, sub, initial=self.balance)) < 0:
+                raise ValueError("Balance cannot be less than $0")
+            super().withdraw_many(amounts)
+
+    @staticmethod
+    def apply_withdrawals(accounts, account_ids, amounts):
+        """Withdraw each amount from accounts[account_id] in order.
+
+        Withdrawals which would drop a balance below zero are skipped
+        instead of raising.  Returns an array with 1 for each rejected
+        withdrawal and 0 for each applied one.
+        """
+        if len(account_ids) != len(amounts):
+            raise ValueError("account_ids and amounts differ in length")
+        if len(amounts) and min(amounts) < 0:
+            raise ValueError("Cannot withdraw a negative amount")
+        rejected = array('B', bytes(len(amounts)))
+        positions = defaultdict(list)
+        for position, account_id in enumerate(account_ids):
+            positions[account_id].append(position)
+        for account_id, indexes in positions.items():
+            account = accounts[account_id]
+            with account._lock:
+                requested = [amounts[i] for i in indexes]
+                if min(accumulate(requested, sub, initial=account.balance)) < 0:
+                    balance = account.balance
+                    accepted = []
+                    for index, amount in zip(indexes, requested):
+                        if balance - amount < 0:
+                            rejected[index] = 1
+                        else:
+                            balance -= amount
+                            accepted.append(amount)
+                    requested = accepted
+                account.withdraw_many(requested)
+        return rejected
+
 
 class Node:
 
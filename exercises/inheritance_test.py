@@ -1,4 +1,6 @@
 """Tests for inheritance exercises"""
+import random
+from timeit import default_timer
 import unittest
 
 from inheritance import (
@@ -153,6 +155,68 @@ class MinimumBalanceAccountTests(unittest.TestCase):
         account = MinimumBalanceAccount()
         self.assertEqual(repr(account), 'MinimumBalanceAccount(balance=0)')
 
+    def test_post_batch_cannot_overdraw(self):
+        account = MinimumBalanceAccount()
+        with self.assertRaises(ValueError):
+            account.post_batch([('DEPOSIT', 10), ('WITHDRAWAL', 11)])
+        self.assertEqual(account.balance, 0)
+        account.post_batch([('DEPOSIT', 10), ('WITHDRAWAL', 10)])
+        self.assertEqual(account.balance, 0)
+
+    def test_withdraw_many_cannot_overdraw(self):
+        account = MinimumBalanceAccount()
+        account.deposit(10)
+        with self.assertRaises(ValueError):
+            account.withdraw_many([5, 6])
+        self.assertEqual(account.balance, 10)
+        account.withdraw_many([5, 5])
+        self.assertEqual(account.balance, 0)
+
+    def test_apply_withdrawals(self):
+        accounts = [MinimumBalanceAccount() for _ in range(3)]
+        for account, balance in zip(accounts, [100, 10, 50]):
+            account.deposit(balance)
+        rejected = MinimumBalanceAccount.apply_withdrawals(
+            accounts,
+            [0, 1, 0, 1, 2, 1, 0],
+            [30, 8, 60, 5, 50, 2, 20],
+        )
+        self.assertEqual(list(rejected), [0, 0, 0, 1, 0, 0, 1])
+        self.assertEqual([a.balance for a in accounts], [10, 0, 0])
+        self.assertEqual(accounts[1].transactions[-1], ('WITHDRAWAL', -2, 0))
+        with self.assertRaises(ValueError):
+            MinimumBalanceAccount.apply_withdrawals(accounts, [0], [-5])
+        with self.assertRaises(ValueError):
+            MinimumBalanceAccount.apply_withdrawals(accounts, [0, 1], [5])
+
+    def test_bulk_withdrawals_faster_than_loop(self):
+        rng = random.Random(1)
+        ids = [rng.randrange(100) for _ in range(50_000)]
+        amounts = [rng.randint(1, 20) for _ in ids]
+        loop_accounts = [MinimumBalanceAccount() for _ in range(100)]
+        bulk_accounts = [MinimumBalanceAccount() for _ in range(100)]
+        for account in loop_accounts + bulk_accounts:
+            account.deposit(4_000)
+        with Timer() as loop_timer:
+            loop_rejected = []
+            for account_id, amount in zip(ids, amounts):
+                try:
+                    loop_accounts[account_id].withdraw(amount)
+                except ValueError:
+                    loop_rejected.append(1)
+                else:
+                    loop_rejected.append(0)
+        with Timer() as bulk_timer:
+            rejected = MinimumBalanceAccount.apply_withdrawals(
+                bulk_accounts, ids, amounts,
+            )
+        self.assertEqual(list(rejected), loop_rejected)
+        self.assertEqual(
+            [a.balance for a in bulk_accounts],
+            [a.balance for a in loop_accounts],
+        )
+        self.assertLess(bulk_timer.elapsed, loop_timer.elapsed)
+
 
 class NodeTests(unittest.TestCase):
 
@@ -460,6 +524,19 @@ class MaxCounterTests(unittest.TestCase):
         self.assertEqual(set(counts.max_keys()), set())
 
 
+class Timer:
+
+    """Context manager to time a code block."""
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *args):
+        self.end = default_timer()
+        self.elapsed = self.end - self.start
+
+
 if __name__ == "__main__":
     from helpers import error_message
     error_message()
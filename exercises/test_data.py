@@ -1,4 +1,5 @@
 TESTS = {
+    "AccountJournal": "classes_test.AccountJournalTests",
     "days_to_tuesday": "refactoring_test.DaysToTuesdayTests",
     "days_until": "refactoring_test.DaysUntilFunctionTests",
     "IMAPChecker": "refactoring_test.IMAPCheckerTests",
@@ -7,10 +8,13 @@ TESTS = {
     "next_tuesday": "refactoring_test.NextTuesdayTests",
     "is_ok": "initial_test.InitialTests",
     "Comparator": "dunder_test.ComparatorTests",
+    "ConcatView": "dunder_test.SequenceViewTests",
     "FancyDict": "dunder_test.FancyDictTests",
     "reloopable": "dunder_test.ReloopableTests",
     "ReverseView": "dunder_test.ReverseViewTests",
     "RomanNumeral": "dunder_test.RomanNumeralTests",
+    "SliceView": "dunder_test.SequenceViewTests",
+    "StrideView": "dunder_test.SequenceViewTests",
     "Timer": "dunder_test.TimerTests",
     "CyclicList": "inheritance_test.CyclicListTests",
     "DoublyLinkedNode": "inheritance_test.DoublyLinkedNodeTests",
@@ -26,34 +30,56 @@ TESTS = {
     "Person": "properties_test.PersonTests",
     "Vector": "properties_test.VectorTests",
     "BankAccount": "classes_test.BankAccountTests",
+    "CompactSuperMap": "classes_test.CompactSuperMapTests",
+    "FlavorCatalog": "classes_test.FlavorCatalogTests",
     "Flavor": "classes_test.FlavorTests",
     "IceCream": "classes_test.IceCreamTests",
+    "IndexedMinHeap": "classes_test.IndexedMinHeapTests",
+    "Menu": "classes_test.MenuTests",
     "MinHeap": "classes_test.MinHeapTests",
+    "MonthArray": "classes_test.MonthArrayTests",
     "MonthDelta": "classes_test.MonthDeltaTests",
+    "MonthRange": "classes_test.MonthRangeTests",
     "Month": "classes_test.MonthTests",
     "Row": "classes_test.RowTests",
+    "RowTable": "classes_test.RowTableTests",
     "Size": "classes_test.SizeTests",
-    "SuperMap": "classes_test.SuperMapTests"
+    "SuperMap": "classes_test.SuperMapTests",
+    "TransferEngine": "classes_test.TransferEngineTests",
+    "VersionedSuperMap": "classes_test.VersionedSuperMapTests"
 }
 
 MODULES = {
     "classes": [
+        "AccountJournal",
         "BankAccount",
+        "CompactSuperMap",
+        "FlavorCatalog",
         "Flavor",
         "IceCream",
+        "IndexedMinHeap",
+        "Menu",
         "MinHeap",
+        "MonthArray",
         "MonthDelta",
+        "MonthRange",
         "Month",
         "Row",
+        "RowTable",
         "Size",
-        "SuperMap"
+        "SuperMap",
+        "TransferEngine",
+        "VersionedSuperMap"
     ],
     "dunder": [
         "Comparator",
+        "ConcatView",
         "FancyDict",
         "reloopable",
         "ReverseView",
         "RomanNumeral",
+        "SliceView",
+        "StrideView",
         "Timer"
     ],
     "inheritance": [